@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Benchmark MCP Project Builder
+Generuje syntetyczny korpus Markdown i mierzy przepustowość kolejnych etapów
+ProjectBuilder (files/s i MB/s), zapisując wyniki do pliku JSON.
+Użycie: python bench_builder.py [--docs N] [--output wyniki.json] [--compare stare.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import logging
+from pathlib import Path
+from typing import List, Dict, Callable
+from datetime import datetime
+
+from build_project import ProjectBuilder
+
+logger = logging.getLogger(__name__)
+
+# Style nagłówków ze ścieżką pliku: nazwa -> funkcja tworząca blok (ścieżka, treść)
+HEADER_STYLES = {
+    'hash': lambda path, body: f"```yaml\n# {path}.yml\n{body}\n```\n",
+    'slash': lambda path, body: f"```javascript\n// {path}.js\n{body}\n```\n",
+    'heading': lambda path, body: f"### Plik: `{path}.ts`\n\n```typescript\n{body}\n```\n",
+    'json': lambda path, body: f"```json\n// {path}.json\n{{\"name\": \"{path}\", \"value\": 1}}\n```\n",
+    'env': lambda path, body: f"```env\n# {path}.env\nKEY=value\n{body}\n```\n",
+    'dockerfile': lambda path, body: f"```dockerfile\n# {path}/Dockerfile\nFROM python:3.11\n{body}\n```\n",
+    'shebang': lambda path, body: f"```bash\n#!/bin/bash\n# {path}.sh\n{body}\n```\n",
+    'plain': lambda path, body: f"```bash\n{body}\n```\n",
+}
+
+PROSE = (
+    "MCP Manager to platforma do zarządzania serwerami Model Context Protocol. "
+    "Ten akapit jest wypełniaczem, który symuluje opis usługi w dokumentacji. "
+)
+
+
+def generate_document(rng: random.Random, index: int, size: int, blocks: int,
+                      styles: List[str], unterminated: float, block_lines: int) -> str:
+    """Generuje jeden dokument Markdown o przybliżonym rozmiarze `size` bajtów"""
+    parts = [f"# Dokument {index}\n\n"]
+    prose_per_block = max(0, size // max(blocks, 1) - block_lines * 40)
+
+    for block in range(blocks):
+        parts.append(PROSE * (prose_per_block // len(PROSE) + 1))
+        parts.append("\n\n")
+        body = "\n".join(
+            f"    line_{line} = compute({index}, {block}, {line})  # {'x' * 16}"
+            for line in range(block_lines)
+        )
+        style = styles[rng.randrange(len(styles))]
+        path = f"services/doc{index}/block{block}"
+        parts.append(HEADER_STYLES[style](path, body))
+        parts.append("\n")
+
+    # Przypadek patologiczny: niezamknięty blok do końca dokumentu
+    if rng.random() < unterminated:
+        parts.append("```python\n# services/unterminated.py\n")
+        parts.append("print('brak zamknięcia')\n" * block_lines)
+
+    return "".join(parts)
+
+
+def generate_corpus(target: Path, docs: int, size: int, blocks: int, styles: List[str],
+                    unterminated: float, block_lines: int, seed: int) -> List[Path]:
+    """Zapisuje syntetyczny korpus do katalogu `target`"""
+    rng = random.Random(seed)
+    target.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for index in range(docs):
+        path = target / f"doc_{index:05d}.md"
+        path.write_text(
+            generate_document(rng, index, size, blocks, styles, unterminated, block_lines),
+            encoding='utf-8'
+        )
+        paths.append(path)
+    return paths
+
+
+def measure(name: str, repeat: int, files: int, size: int, func: Callable[[], None]) -> Dict:
+    """Uruchamia `func` `repeat` razy i zwraca najlepszy czas z przepustowością"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    result = {
+        'stage': name,
+        'files': files,
+        'bytes': size,
+        'best_s': best,
+        'median_s': sorted(timings)[len(timings) // 2],
+        'files_per_s': files / best if best else None,
+        'mb_per_s': size / best / 1e6 if best else None,
+    }
+    logger.info(
+        f"⏱️  {name:<26} {best * 1000:9.2f} ms  "
+        f"{result['files_per_s'] or 0:10.0f} files/s  {result['mb_per_s'] or 0:8.2f} MB/s"
+    )
+    return result
+
+
+def run_benchmark(args) -> Dict:
+    """Generuje korpus i mierzy etapy buildera"""
+    workdir = Path(tempfile.mkdtemp(prefix='mcp-bench-'))
+    try:
+        corpus = generate_corpus(
+            workdir / 'corpus', args.docs, args.doc_size, args.blocks,
+            args.styles, args.unterminated, args.block_lines, args.seed
+        )
+        documents = [path.read_text(encoding='utf-8') for path in corpus]
+        corpus_bytes = sum(len(document.encode('utf-8')) for document in documents)
+        logger.info(f"📚 Korpus: {len(documents)} dokumentów, {corpus_bytes / 1e6:.2f} MB")
+
+        builder = ProjectBuilder(str(workdir / 'corpus'), str(workdir / 'out'))
+        results = [
+            measure('extract_code_blocks', args.repeat, len(documents), corpus_bytes,
+                    lambda: [builder.extract_code_blocks(document) for document in documents]),
+            measure('extract_file_definitions', args.repeat, len(documents), corpus_bytes,
+                    lambda: [builder.extract_file_definitions(document) for document in documents]),
+        ]
+
+        definitions = [
+            file_def
+            for document in documents
+            for file_def in builder.extract_file_definitions(document)
+        ]
+        definitions_bytes = sum(len(file_def['code'].encode('utf-8')) for file_def in definitions)
+        results.append(measure(
+            'process_file_content', args.repeat, len(definitions), definitions_bytes,
+            lambda: [builder.process_file_content(file_def['code'], file_def['language'], file_def['filepath'])
+                     for file_def in definitions]
+        ))
+
+        def create_files():
+            # Za każdym razem pusty katalog i brak manifestu - mierzymy pełny zapis
+            shutil.rmtree(builder.output_dir, ignore_errors=True)
+            builder.previous_manifest = builder.load_manifest()
+            builder.dirs_created = set()
+            builder.writer.dirs = set()
+            builder.files_created = []
+            builder.create_file_structure(definitions)
+
+        results.append(measure(
+            'create_file_structure', args.repeat, len(definitions), definitions_bytes, create_files
+        ))
+
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'parameters': {
+                'docs': args.docs,
+                'doc_size': args.doc_size,
+                'blocks': args.blocks,
+                'block_lines': args.block_lines,
+                'styles': args.styles,
+                'unterminated': args.unterminated,
+                'seed': args.seed,
+                'repeat': args.repeat,
+            },
+            'corpus_bytes': corpus_bytes,
+            'definitions': len(definitions),
+            'results': results,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare_results(current: Dict, baseline: Dict, threshold: float) -> bool:
+    """Porównuje wyniki z poprzednim przebiegiem; zwraca False przy regresji"""
+    baseline_stages = {result['stage']: result for result in baseline['results']}
+    ok = True
+    for result in current['results']:
+        previous = baseline_stages.get(result['stage'])
+        if not previous or not previous['best_s']:
+            continue
+        change = result['best_s'] / previous['best_s'] - 1
+        marker = '✅'
+        if change > threshold:
+            marker = '❌'
+            ok = False
+        logger.info(f"{marker} {result['stage']:<26} {change * 100:+7.1f}% względem poprzedniego wyniku")
+    return ok
+
+
+def main():
+    """Główna funkcja programu"""
+    parser = argparse.ArgumentParser(
+        description='Benchmark MCP Project Builder na syntetycznym korpusie Markdown',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Przykłady użycia:
+  python bench_builder.py
+  python bench_builder.py --docs 500 --doc-size 200000 --output bench.json
+  python bench_builder.py --styles hash slash --unterminated 0.5
+  python bench_builder.py --output nowe.json --compare stare.json
+        """
+    )
+
+    parser.add_argument('--docs', type=int, default=200, help='Liczba dokumentów (domyślnie: 200)')
+    parser.add_argument('--doc-size', type=int, default=20000, help='Przybliżony rozmiar dokumentu w bajtach (domyślnie: 20000)')
+    parser.add_argument('--blocks', type=int, default=10, help='Liczba bloków kodu na dokument (domyślnie: 10)')
+    parser.add_argument('--block-lines', type=int, default=20, help='Liczba linii w bloku kodu (domyślnie: 20)')
+    parser.add_argument(
+        '--styles', nargs='+', choices=sorted(HEADER_STYLES), default=sorted(HEADER_STYLES),
+        help='Style nagłówków ze ścieżką pliku, losowane dla każdego bloku (domyślnie: wszystkie)'
+    )
+    parser.add_argument('--unterminated', type=float, default=0.1,
+                        help='Odsetek dokumentów z niezamkniętym blokiem na końcu (domyślnie: 0.1)')
+    parser.add_argument('--repeat', type=int, default=3, help='Liczba powtórzeń każdego pomiaru (domyślnie: 3)')
+    parser.add_argument('--seed', type=int, default=42, help='Ziarno generatora korpusu (domyślnie: 42)')
+    parser.add_argument('--output', '-o', help='Plik JSON z wynikami')
+    parser.add_argument('--compare', help='Plik JSON z poprzednimi wynikami do porównania')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Dopuszczalne spowolnienie przy --compare (domyślnie: 0.1 = 10%%)')
+
+    args = parser.parse_args()
+
+    # Logi buildera (po jednym na plik) zniekształcałyby pomiary
+    logging.getLogger('build_project').setLevel(logging.WARNING)
+
+    report = run_benchmark(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"📝 Zapisano wyniki: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare_results(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,32 @@ Automatycznie generuje strukturę projektu z plików Markdown
 Użycie: python build_project.py <folder_z_markdown> [--output <folder_docelowy>]
 """
 
+import io
 import os
 import re
+import stat
+import posixpath
 import sys
 import argparse
 import json
-import yaml
+import time
+import select
+import struct
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from functools import partial
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator, Callable
 import logging
 from datetime import datetime
 
+# Moduły potrzebne tylko w części trybów (concurrent.futures, tarfile, zipfile,
+# socketserver) są importowane przy pierwszym użyciu - krótszy start procesu
+
 # Konfiguracja logowania
 logging.basicConfig(
     level=logging.INFO,
@@ -23,140 +38,973 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Manifest budowania (zapisywany w folderze docelowym) - zmiana wersji
+# wymusza pełne przebudowanie
+MANIFEST_NAME = '.build_manifest.json'
+MANIFEST_VERSION = 2
+
+# Maksymalna liczba plików Markdown w jednej paczce dla procesu roboczego
+PIPELINE_CHUNK_SIZE = 16
+
+# Rozszerzenia plików Markdown
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+
+# Liczba wątków zapisujących pliki wynikowe (domyślnie) i liczba plików
+# w jednym zadaniu puli
+WRITER_THREADS = 8
+WRITER_BATCH = 32
+
+# Format wyniku (--output-format): nazwa -> rozszerzenie archiwum ('dir' = katalog)
+OUTPUT_FORMATS = {'dir': '', 'tar': '.tar', 'tar.zst': '.tar.zst', 'zip': '.zip'}
+
+# Plik z danymi profilowania (--profile) obok BUILD_REPORT.txt
+PROFILE_NAME = 'BUILD_PROFILE.json'
+
+_NULL_CONTEXT = nullcontext()
+
+# Tryb --serve: maksymalna liczba sparsowanych dokumentów w pamięci podręcznej
+DOCUMENT_CACHE_SIZE = 4096
+
+# Tryb --watch: odstęp odpytywania (bez inotify) i czas zbierania zdarzeń
+WATCH_POLL_INTERVAL = 0.5
+WATCH_DEBOUNCE = 0.05
+
+# Tabela reguł rozpoznawania ścieżki pliku w bloku kodu, w kolejności priorytetu.
+# source='heading' - wzorzec szukany w ostatniej niepustej linii przed blokiem,
+# source='line' - wzorzec dopasowany do pierwszej niepustej linii bloku
+# (linia ta nie trafia do zawartości pliku). 'languages' ogranicza regułę do
+# podanych języków bloku, 'strict' wymaga, by ścieżka zawierała '/' lub '.'.
+PATH_RULES = [
+    # Format: ### Plik: path/to/file.ext
+    {
+        'name': 'heading',
+        'source': 'heading',
+        'languages': None,
+        'pattern': re.compile(r'###?\s*(?:Plik|File|Config|Configuration):\s*`?([^\n`]+)`?\s*$'),
+    },
+    # Format dla package.json i innych JSON-ów
+    {
+        'name': 'json',
+        'source': 'line',
+        'languages': {'json'},
+        'pattern': re.compile(r'(?://|#)?\s*(.+\.json)\s*$'),
+    },
+    # Format dla .env
+    {
+        'name': 'env',
+        'source': 'line',
+        'languages': {'bash', 'text', 'env'},
+        'pattern': re.compile(r'#\s*(.*\.env(?:\.\w+)?)\s*$'),
+    },
+    # Format dla Dockerfile
+    {
+        'name': 'dockerfile',
+        'source': 'line',
+        'languages': {'dockerfile'},
+        'pattern': re.compile(r'#\s*(.*Dockerfile.*)$'),
+    },
+    # Format: ```language\n# path/to/file.ext\ncode```
+    {
+        'name': 'hash-comment',
+        'source': 'line',
+        'languages': None,
+        'strict': True,
+        'pattern': re.compile(r'#\s*(.+)$'),
+    },
+    # Format: ```language\n// path/to/file.ext\ncode```
+    {
+        'name': 'slash-comment',
+        'source': 'line',
+        'languages': None,
+        'strict': True,
+        'pattern': re.compile(r'//\s*(.+)$'),
+    },
+]
+
+
+def iter_fenced_blocks(lines: Iterable[str]) -> Iterator[Dict]:
+    """Jednoprzebiegowy tokenizer bloków ```kodu``` w Markdown.
+    
+    Przyjmuje dowolne iterowalne linie (np. otwarty plik), więc w pamięci
+    trzymany jest tylko bieżący blok. Zwraca słowniki z językiem bloku,
+    ostatnią niepustą linią przed blokiem, liniami treści i numerem linii.
+    Niezamknięte bloki na końcu dokumentu są pomijane.
+    """
+    heading = ''
+    fence = None
+    block = None
+    
+    for lineno, line in enumerate(lines, 1):
+        if fence is None:
+            if '```' in line:
+                stripped = line.lstrip(' \t')
+                if stripped.startswith('```'):
+                    marker = stripped[:len(stripped) - len(stripped.lstrip('`'))]
+                    info = stripped[len(marker):].strip()
+                    if '`' not in info:
+                        fence = marker
+                        block = {
+                            'language': info.split()[0] if info else '',
+                            'heading': heading,
+                            'lines': [],
+                            'line': lineno
+                        }
+                        continue
+            if line.strip():
+                heading = line.strip()
+        else:
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip('`'):
+                fence = None
+                heading = ''
+                if block['language']:
+                    yield block
+                block = None
+            else:
+                block['lines'].append(line)
+
+
+def iter_source_lines(path: Path, digest=None) -> Iterator[str]:
+    """Czyta plik linia po linii (bez wczytywania całości), opcjonalnie licząc skrót"""
+    with open(path, 'rb') as f:
+        for raw in f:
+            if digest is not None:
+                digest.update(raw)
+            line = raw.decode('utf-8')
+            if line.endswith('\r\n'):
+                line = line[:-2] + '\n'
+            yield line
+
+
+def normalize_output_path(filepath: str) -> Optional[str]:
+    """Normalizuje ścieżkę pliku wynikowego (klucz indeksu); None dla ścieżek
+    absolutnych lub wychodzących poza folder docelowy"""
+    path = posixpath.normpath(filepath.replace('\\', '/'))
+    if path.startswith('/') or path == '.' or path == '..' or path.startswith('../'):
+        return None
+    return path
+
+
+def is_executable(filepath: str) -> bool:
+    """Czy plik wynikowy dostaje prawa wykonywania (skrypty)"""
+    return filepath.endswith('.sh') or 'bin/' in filepath
+
+
+def plan_to_json(plan: Dict) -> str:
+    """Serializuje plan do JSON (bez treści plików)"""
+    serializable = dict(plan)
+    serializable['files'] = [
+        {name: value for name, value in file_plan.items() if name != 'content'}
+        for file_plan in plan['files']
+    ]
+    return json.dumps(serializable, indent=2, ensure_ascii=False)
+
+
+def hash_file(path: Path) -> str:
+    """Liczy skrót SHA-256 pliku, czytając go fragmentami"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildProfiler:
+    """Zbiera czasy faz budowania, statystyki reguł ścieżek i czasy dokumentów (--profile)"""
+    
+    PHASES = ('scan', 'read', 'extract', 'process', 'mkdir', 'write', 'chmod')
+    
+    def __init__(self, enabled: bool = False, top: int = 10):
+        self.enabled = enabled
+        self.top = top
+        # Fazy write/chmod są mierzone w wątkach zapisujących
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        self.phases = {}
+        self.rules = {}
+        self.documents = []
+    
+    def phase(self, name: str):
+        """Kontekst mierzący czas ściany i CPU fazy (bez narzutu, gdy wyłączony)"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._measure_phase(name)
+    
+    @contextmanager
+    def _measure_phase(self, name: str):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            with self.lock:
+                stats = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+                stats['wall'] += wall
+                stats['cpu'] += cpu
+                stats['calls'] += 1
+    
+    def rule_stats(self, name: str) -> Dict:
+        return self.rules.setdefault(name, {'attempts': 0, 'matches': 0, 'hits': 0, 'time': 0.0})
+    
+    def record_rule(self, name: str, seconds: float, matched: bool):
+        """Rejestruje jedno dopasowanie wzorca reguły"""
+        stats = self.rule_stats(name)
+        stats['attempts'] += 1
+        stats['matches'] += matched
+        stats['time'] += seconds
+    
+    def record_hit(self, name: str):
+        """Rejestruje regułę, która wyznaczyła ścieżkę pliku"""
+        self.rule_stats(name)['hits'] += 1
+    
+    def record_document(self, source: str, seconds: float, size: int):
+        self.documents.append({'source': source, 'seconds': seconds, 'bytes': size})
+    
+    def drain(self) -> Dict:
+        """Zwraca zebrane dane i zeruje liczniki (przekazanie z procesu roboczego)"""
+        data = {'phases': self.phases, 'rules': self.rules, 'documents': self.documents}
+        self.reset()
+        return data
+    
+    def merge(self, data: Dict):
+        """Dołącza dane zebrane w innym procesie"""
+        for name, stats in data['phases'].items():
+            target = self.phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            for key, value in stats.items():
+                target[key] += value
+        for name, stats in data['rules'].items():
+            target = self.rule_stats(name)
+            for key, value in stats.items():
+                target[key] += value
+        self.documents.extend(data['documents'])
+    
+    def summary(self) -> Dict:
+        """Podsumowanie w formie gotowej do zapisu jako JSON"""
+        phase_names = list(self.PHASES) + sorted(set(self.phases) - set(self.PHASES))
+        return {
+            'phases': {name: self.phases[name] for name in phase_names if name in self.phases},
+            'rules': self.rules,
+            'slowest_documents': sorted(self.documents, key=lambda doc: doc['seconds'], reverse=True)[:self.top],
+        }
+    
+    def format_report(self) -> str:
+        """Sekcja profilowania do BUILD_REPORT.txt"""
+        summary = self.summary()
+        lines = ["\n⏱️  Profil budowania:", "\nFazy (ściana / CPU / wywołania):"]
+        for name, stats in summary['phases'].items():
+            lines.append(f"  {name:<10} {stats['wall'] * 1000:10.2f} ms {stats['cpu'] * 1000:10.2f} ms {stats['calls']:8d}")
+        
+        lines.append("\nReguły ścieżek (próby / dopasowania / użyte / czas):")
+        for name, stats in sorted(self.rules.items(), key=lambda item: item[1]['time'], reverse=True):
+            lines.append(
+                f"  {name:<16} {stats['attempts']:8d} {stats['matches']:8d} {stats['hits']:8d} "
+                f"{stats['time'] * 1000:10.2f} ms"
+            )
+        
+        lines.append(f"\nNajwolniejsze dokumenty (top {self.top}):")
+        for document in summary['slowest_documents']:
+            lines.append(f"  {document['seconds'] * 1000:10.2f} ms {document['bytes']:10d} B  {document['source']}")
+        return "\n".join(lines) + "\n"
+
+
+def atomic_write(path: Path, content: str, mode: int, fsync: bool = False, profiler=None):
+    """Zapisuje plik atomowo: plik tymczasowy w tym samym katalogu + rename"""
+    profiler = profiler or _DISABLED_PROFILER
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with profiler.phase('write'):
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        # mkstemp tworzy plik z prawami 0600 - ustawiamy docelowe
+        with profiler.phase('chmod'):
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class FileWriter:
+    """Zapis plików wynikowych: każdy katalog tworzony raz, zapis w puli wątków,
+    atomowo (plik tymczasowy + rename), opcjonalnie wspólny fsync na końcu"""
+    
+    def __init__(self, on_done: Callable[[str, Path, Optional[Exception]], None],
+                 threads: int = WRITER_THREADS, fsync: bool = False, profiler=None):
+        self.on_done = on_done
+        self.threads = threads
+        self.fsync = fsync
+        self.profiler = profiler or _DISABLED_PROFILER
+        self.dirs = set()
+        self.batch = []
+        self.pending = deque()
+        self.written = []
+        self.pool = None
+        # Domyślne prawa nowych plików, jak przy open(..., 'w')
+        umask = os.umask(0)
+        os.umask(umask)
+        self.file_mode = 0o666 & ~umask
+    
+    def ensure_dir(self, directory: Path) -> bool:
+        """Tworzy katalog, jeśli nie był jeszcze widziany; True przy pierwszym użyciu"""
+        if directory in self.dirs:
+            return False
+        with self.profiler.phase('mkdir'):
+            directory.mkdir(parents=True, exist_ok=True)
+        self.dirs.add(directory)
+        return True
+    
+    def ensure_dirs(self, directories: Iterable[Path]) -> int:
+        """Plan katalogów: tworzy każdy unikalny katalog raz, od najpłytszych"""
+        return sum(self.ensure_dir(directory) for directory in sorted(set(directories)))
+    
+    def submit(self, filepath: str, full_path: Path, content: str, executable: bool):
+        """Zleca zapis pliku (katalog nadrzędny musi już istnieć)"""
+        mode = 0o755 if executable else self.file_mode
+        if self.threads <= 1:
+            error = self.write(full_path, content, mode)
+            if error is None and self.fsync:
+                self.written.append(full_path)
+            self.on_done(filepath, full_path, error)
+            return
+        
+        # Pliki są zlecane paczkami - jedno zadanie puli na WRITER_BATCH plików
+        self.batch.append((filepath, full_path, content, mode))
+        if len(self.batch) >= WRITER_BATCH:
+            self.submit_batch()
+    
+    def submit_batch(self):
+        if not self.batch:
+            return
+        if self.pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='writer')
+        # Ograniczona liczba paczek w locie - treści nie kumulują się w pamięci
+        while len(self.pending) >= self.threads * 2:
+            self.complete(self.pending.popleft())
+        batch, self.batch = self.batch, []
+        self.pending.append((batch, self.pool.submit(self.write_batch, batch)))
+    
+    def write(self, full_path: Path, content: str, mode: int) -> Optional[Exception]:
+        try:
+            # Przy fsync zbiorczym synchronizacja następuje w flush()
+            atomic_write(full_path, content, mode, profiler=self.profiler)
+            return None
+        except Exception as e:
+            return e
+    
+    def write_batch(self, batch: List[Tuple[str, Path, str, int]]) -> List[Optional[Exception]]:
+        return [self.write(full_path, content, mode) for _, full_path, content, mode in batch]
+    
+    def complete(self, pending: Tuple[List[Tuple[str, Path, str, int]], object]):
+        batch, future = pending
+        for (filepath, full_path, _, _), error in zip(batch, future.result()):
+            if error is None and self.fsync:
+                self.written.append(full_path)
+            self.on_done(filepath, full_path, error)
+    
+    def flush(self):
+        """Czeka na wszystkie zlecone zapisy i wykonuje zbiorczy fsync"""
+        self.submit_batch()
+        while self.pending:
+            self.complete(self.pending.popleft())
+        
+        if self.fsync and self.written:
+            targets = self.written + sorted({path.parent for path in self.written})
+            self.written = []
+            with self.profiler.phase('fsync'):
+                if self.pool is not None:
+                    list(self.pool.map(fsync_path, targets))
+                else:
+                    for target in targets:
+                        fsync_path(target)
+    
+    def write_file(self, path: Path, content: str):
+        """Zapisuje od razu plik generowany przez builder (README, Makefile, raport)"""
+        atomic_write(path, content, self.file_mode, fsync=self.fsync, profiler=self.profiler)
+
+    def close(self):
+        self.flush()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def load_zstandard():
+    """Importuje opcjonalny pakiet zstandard (--output-format tar.zst)"""
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Format tar.zst wymaga pakietu zstandard (pip install zstandard)") from None
+    return zstandard
+
+
+class ArchiveWriter:
+    """Zapis plików wynikowych wprost do archiwum tar / tar.zst / zip, bez drzewa
+    katalogów na dysku. Wpisy są dopisywane strumieniowo w wątku głównym, a ścieżki
+    w archiwum zaczynają się od nazwy folderu docelowego. Archiwum powstaje jako
+    plik tymczasowy i jest podmieniane atomowo w close()."""
+
+    def __init__(self, path: Path, root: Path, archive_format: str,
+                 on_done: Callable[[str, Path, Optional[Exception]], None], profiler=None):
+        self.path = path
+        self.root = root
+        self.format = archive_format
+        self.on_done = on_done
+        self.profiler = profiler or _DISABLED_PROFILER
+        self.dirs = set()
+        self.files = set()
+        self.archive = None
+        self.stream = None
+        self.compressor = None
+        self.tmp_path = None
+        # Wspólny czas modyfikacji wpisów; SOURCE_DATE_EPOCH daje powtarzalne archiwa
+        self.mtime = int(os.environ.get('SOURCE_DATE_EPOCH', time.time()))
+        umask = os.umask(0)
+        os.umask(umask)
+        self.file_mode = 0o666 & ~umask
+
+    def open(self):
+        """Otwiera archiwum przy pierwszym wpisie (--dry-run niczego nie tworzy)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f'.{self.path.name}.', suffix='.tmp')
+        self.stream = os.fdopen(fd, 'wb')
+        if self.format == 'zip':
+            import zipfile
+            self.archive = zipfile.ZipFile(self.stream, 'w', zipfile.ZIP_DEFLATED)
+            return
+
+        fileobj = self.stream
+        if self.format == 'tar.zst':
+            self.compressor = load_zstandard().ZstdCompressor().stream_writer(self.stream, closefd=False)
+            fileobj = self.compressor
+        import tarfile
+        # Tryb strumieniowy 'w|' - tarfile nie cofa się w pliku
+        self.archive = tarfile.open(fileobj=fileobj, mode='w|', format=tarfile.PAX_FORMAT)
+
+    def arcname(self, path: Path) -> str:
+        relative = path.relative_to(self.root).as_posix()
+        return self.root.name if relative == '.' else f"{self.root.name}/{relative}"
+
+    def add(self, path: Path, data: bytes, mode: int, directory: bool = False):
+        """Dopisuje jeden wpis (plik lub katalog) do archiwum"""
+        if self.archive is None:
+            self.open()
+        name = self.arcname(path)
+
+        with self.profiler.phase('write'):
+            if self.format == 'zip':
+                import zipfile
+                # ZIP nie obsługuje dat sprzed 1980
+                date_time = max(time.localtime(self.mtime)[:6], (1980, 1, 1, 0, 0, 0))
+                info = zipfile.ZipInfo(name + '/' if directory else name, date_time=date_time)
+                if directory:
+                    info.external_attr = ((stat.S_IFDIR | mode) << 16) | 0x10
+                else:
+                    info.external_attr = (stat.S_IFREG | mode) << 16
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                self.archive.writestr(info, data)
+            else:
+                import tarfile
+                info = tarfile.TarInfo(name)
+                info.mtime = self.mtime
+                info.mode = mode
+                if directory:
+                    info.type = tarfile.DIRTYPE
+                else:
+                    info.size = len(data)
+                self.archive.addfile(info, io.BytesIO(data) if not directory else None)
+
+    def ensure_dir(self, directory: Path) -> bool:
+        """Dodaje wpis katalogu (i brakujących nadrzędnych); True przy pierwszym użyciu"""
+        if directory in self.dirs:
+            return False
+        missing = []
+        current = directory
+        while current not in self.dirs and is_relative_to(current, self.root):
+            missing.append(current)
+            if current == self.root:
+                break
+            current = current.parent
+        for path in reversed(missing):
+            self.add(path, b'', 0o755, directory=True)
+            self.dirs.add(path)
+        return True
+
+    def ensure_dirs(self, directories: Iterable[Path]) -> int:
+        return sum(self.ensure_dir(directory) for directory in sorted(set(directories)))
+
+    def submit(self, filepath: str, full_path: Path, content: str, executable: bool):
+        """Dopisuje plik wynikowy do archiwum (wynik od razu przekazywany do on_done)"""
+        mode = 0o755 if executable else self.file_mode
+        try:
+            self.add(full_path, content.encode('utf-8'), mode)
+            self.files.add(full_path)
+            error = None
+        except Exception as e:
+            error = e
+        self.on_done(filepath, full_path, error)
+
+    def write_file(self, path: Path, content: str):
+        """Dopisuje plik generowany przez builder (README, Makefile, raport)"""
+        self.ensure_dir(path.parent)
+        self.add(path, content.encode('utf-8'), self.file_mode)
+        self.files.add(path)
+
+    def flush(self):
+        """Wpisy są zapisywane od razu - nic nie czeka w kolejce"""
+
+    def close(self):
+        """Zamyka archiwum i podmienia je atomowo pod docelową nazwą"""
+        if self.archive is None:
+            return
+        self.archive.close()
+        if self.compressor is not None:
+            self.compressor.close()
+        self.stream.close()
+        os.chmod(self.tmp_path, self.file_mode)
+        os.replace(self.tmp_path, self.path)
+        self.archive = self.stream = self.compressor = self.tmp_path = None
+
+
+class DocumentCache:
+    """Pamięć podręczna sparsowanych plików Markdown współdzielona między
+    budowaniami w trybie --serve. Wpis jest ważny, dopóki plik ma ten sam
+    mtime i rozmiar; najdawniej używane wpisy są usuwane po przekroczeniu limitu."""
+    
+    def __init__(self, max_entries: int = DOCUMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def signature(self, md_file: Path) -> Optional[Tuple[str, int, int]]:
+        try:
+            stat = md_file.stat()
+        except OSError:
+            return None
+        return str(md_file.resolve()), stat.st_mtime_ns, stat.st_size
+    
+    def iter_results(self, paths: List[Path],
+                     read: Callable[[List[Path]], Iterator[Tuple[List[Dict], Optional[str], Optional[str]]]]
+                     ) -> Iterator[Tuple[List[Dict], Optional[str], Optional[str]]]:
+        """Wyniki parsowania w kolejności `paths`; brakujące są czytane przez `read`"""
+        signatures = [self.signature(md_file) for md_file in paths]
+        cached = []
+        for signature in signatures:
+            entry = self.entries.get(signature[0]) if signature else None
+            cached.append(entry if entry and entry[0] == signature else None)
+        
+        missing = [md_file for md_file, entry in zip(paths, cached) if entry is None]
+        results = read(missing) if missing else iter(())
+        for signature, entry in zip(signatures, cached):
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(signature[0])
+                _, file_definitions, digest = entry
+                # Kopie - definicje są uzupełniane przy scalaniu wyników
+                yield [dict(file_def) for file_def in file_definitions], digest, None
+                continue
+            
+            self.misses += 1
+            file_definitions, digest, error = next(results)
+            if error is None and signature is not None:
+                self.entries[signature[0]] = (signature, [dict(file_def) for file_def in file_definitions], digest)
+                self.entries.move_to_end(signature[0])
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            yield file_definitions, digest, error
+    
+    def summary(self) -> Dict:
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def fsync_path(path: Path):
+    """Synchronizuje plik lub katalog z dyskiem"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_DISABLED_PROFILER = BuildProfiler()
+
+
+class PollingWatcher:
+    """Obserwator zmian plików Markdown oparty na cyklicznym porównywaniu mtime"""
+    
+    def __init__(self, source_dir: Path, ignore_dir: Path, poll_interval: float):
+        self.source_dir = source_dir
+        self.ignore_dir = ignore_dir.resolve()
+        self.poll_interval = poll_interval
+        self.snapshot = self.take_snapshot()
+    
+    def take_snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        """Zwraca (mtime, rozmiar) każdego pliku Markdown w folderze źródłowym"""
+        snapshot = {}
+        for ext in MARKDOWN_EXTENSIONS:
+            for path in self.source_dir.rglob(f'*{ext}'):
+                if is_relative_to(path.resolve(), self.ignore_dir):
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+    
+    def wait(self) -> set:
+        """Czeka na zmiany i zwraca zbiór zmienionych, nowych lub usuniętych plików"""
+        time.sleep(self.poll_interval)
+        snapshot = self.take_snapshot()
+        changed = {
+            path for path in snapshot.keys() | self.snapshot.keys()
+            if snapshot.get(path) != self.snapshot.get(path)
+        }
+        self.snapshot = snapshot
+        return changed
+    
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Obserwator zmian oparty na inotify (Linux), bez zależności zewnętrznych"""
+    
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = struct.Struct('iIII')
+    
+    def __init__(self, source_dir: Path, ignore_dir: Path, debounce: float):
+        import ctypes
+        import ctypes.util
+        
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.ignore_dir = ignore_dir.resolve()
+        self.debounce = debounce
+        self.watches = {}
+        self.add_tree(source_dir)
+    
+    def add_tree(self, directory: Path) -> set:
+        """Dodaje obserwację katalogu i podkatalogów; zwraca znalezione pliki Markdown"""
+        found = set()
+        for root, dirs, files in os.walk(directory):
+            root_path = Path(root)
+            if is_relative_to(root_path.resolve(), self.ignore_dir):
+                dirs[:] = []
+                continue
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), self.WATCH_MASK)
+            if wd >= 0:
+                self.watches[wd] = root_path
+            found.update(root_path / name for name in files if name.endswith(MARKDOWN_EXTENSIONS))
+        return found
+    
+    def read_events(self) -> set:
+        """Odczytuje zdarzenia z deskryptora inotify"""
+        changed = set()
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if wd not in self.watches or not name:
+                continue
+            
+            path = self.watches[wd] / os.fsdecode(name)
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    changed |= self.add_tree(path)
+            elif path.name.endswith(MARKDOWN_EXTENSIONS):
+                changed.add(path)
+        return changed
+    
+    def wait(self) -> set:
+        """Czeka na zmiany i zwraca zbiór zmienionych, nowych lub usuniętych plików"""
+        select.select([self.fd], [], [])
+        changed = self.read_events()
+        # Edytory zapisują plik kilkoma operacjami - zbieramy je w jedną paczkę
+        while select.select([self.fd], [], [], self.debounce)[0]:
+            changed |= self.read_events()
+        return changed
+    
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(source_dir: Path, ignore_dir: Path, poll_interval: float):
+    """Tworzy obserwatora inotify, a gdy jest niedostępny - obserwatora odpytującego"""
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(source_dir, ignore_dir, WATCH_DEBOUNCE)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"⚠️  inotify niedostępne ({e}), używam odpytywania")
+    return PollingWatcher(source_dir, ignore_dir, poll_interval)
+
+
+def is_relative_to(path: Path, other: Path) -> bool:
+    """Odpowiednik Path.is_relative_to() dla Pythona < 3.9"""
+    try:
+        path.relative_to(other)
+        return True
+    except ValueError:
+        return False
+
+
+# Builder procesu roboczego przy równoległym parsowaniu (--jobs)
+_worker_builder = None
+
+
+def _init_worker(builder_class: type, path_rules: List[Dict], profile: bool):
+    """Inicjalizuje proces roboczy z tą samą klasą i tabelą reguł co builder główny"""
+    global _worker_builder
+    _worker_builder = builder_class.__new__(builder_class)
+    _worker_builder.path_rules = path_rules
+    _worker_builder.profiler = BuildProfiler(enabled=profile)
+
+
+def _read_sources_in_worker(paths: List[Path]) -> Tuple[List[Tuple[List[Dict], Optional[str], Optional[str]]], Optional[Dict]]:
+    """Parsuje paczkę plików Markdown w procesie roboczym (wraz z danymi profilowania)"""
+    results = [_worker_builder.read_source(md_file) for md_file in paths]
+    profiler = _worker_builder.profiler
+    return results, profiler.drain() if profiler.enabled else None
+
+
+class VirtualFile:
+    """Plik wirtualnego drzewa projektu - treść jest liczona przy pierwszym odczycie"""
+    
+    __slots__ = ('path', 'language', 'source', 'line', '_render', '_content')
+    
+    def __init__(self, path: str, language: Optional[str], source: Optional[str],
+                 line: Optional[int], render: Callable[[], str]):
+        self.path = path
+        self.language = language
+        # Źródło: klucz pliku Markdown i numer linii otwierającej blok
+        # (None dla plików generowanych przez builder)
+        self.source = source
+        self.line = line
+        self._render = render
+        self._content = None
+    
+    @property
+    def content(self) -> str:
+        if self._content is None:
+            self._content = self._render()
+            self._render = None
+        return self._content
+    
+    @property
+    def materialized(self) -> bool:
+        return self._content is not None
+    
+    @property
+    def executable(self) -> bool:
+        return is_executable(self.path)
+    
+    def __repr__(self) -> str:
+        location = f"{self.source}:{self.line}" if self.source else 'builder'
+        return f"VirtualFile({self.path!r}, {self.language!r}, {location})"
+
+
+class VirtualTree(Mapping):
+    """Wirtualne drzewo projektu: ścieżka → VirtualFile (w kolejności ścieżek)"""
+    
+    def __init__(self, files: Dict[str, VirtualFile], collisions: Dict[str, List[str]]):
+        self.files = files
+        self.collisions = collisions
+    
+    def __getitem__(self, path: str) -> VirtualFile:
+        return self.files[path]
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self.files))
+    
+    def __len__(self) -> int:
+        return len(self.files)
+
+
 class ProjectBuilder:
     """Klasa do budowania struktury projektu z plików Markdown"""
     
-    def __init__(self, source_dir: str, output_dir: str = None):
+    def __init__(self, source_dir: str, output_dir: str = None, incremental: bool = True,
+                 jobs: int = 1, profile: bool = False, profile_top: int = 10,
+                 precedence: str = 'last', write_threads: int = WRITER_THREADS,
+                 fsync: bool = False, output_format: str = 'dir',
+                 document_cache: Optional[DocumentCache] = None):
         self.source_dir = Path(source_dir)
         self.output_dir = Path(output_dir) if output_dir else Path.cwd() / "mcp-manager-project"
+        self.output_format = output_format
+        self.archive_path = None
+        # Archiwum powstaje zawsze od nowa - bez manifestu i budowania przyrostowego
+        self.incremental = incremental and output_format == 'dir'
+        self.precedence = precedence
+        self.jobs = jobs or os.cpu_count() or 1
         self.files_created = []
-        self.dirs_created = []
+        self.dirs_created = set()
+        self.path_rules = list(PATH_RULES)
+        self.document_cache = document_cache
+        self.profiler = BuildProfiler(enabled=profile, top=profile_top)
+        if output_format == 'dir':
+            self.writer = FileWriter(self.finish_write, threads=write_threads, fsync=fsync, profiler=self.profiler)
+        else:
+            # --output projekt.zip lub --output projekt (rozszerzenie dopisywane)
+            suffix = OUTPUT_FORMATS[output_format]
+            if self.output_dir.name.endswith(suffix):
+                self.archive_path = self.output_dir
+                self.output_dir = self.output_dir.with_name(self.output_dir.name[:-len(suffix)])
+            else:
+                self.archive_path = self.output_dir.with_name(self.output_dir.name + suffix)
+            self.writer = ArchiveWriter(self.archive_path, self.output_dir, output_format,
+                                        self.finish_write, profiler=self.profiler)
+        self.manifest = {'version': MANIFEST_VERSION, 'sources': {}, 'outputs': {}}
+        self.previous_manifest = dict(self.manifest)
         self.stats = {
             'files_processed': 0,
+            'files_skipped': 0,
             'files_created': 0,
+            'files_unchanged': 0,
             'dirs_created': 0,
+            'collisions': 0,
             'errors': 0
         }
+        self.reset_output_index()
         
     def scan_markdown_files(self) -> List[Path]:
         """Skanuje folder w poszukiwaniu plików Markdown"""
         markdown_files = []
-        extensions = ['.md', '.markdown']
         
-        for ext in extensions:
-            markdown_files.extend(self.source_dir.rglob(f'*{ext}'))
+        with self.profiler.phase('scan'):
+            for ext in MARKDOWN_EXTENSIONS:
+                markdown_files.extend(self.source_dir.rglob(f'*{ext}'))
+            # Stała kolejność niezależna od systemu plików - budowanie deterministyczne
+            markdown_files.sort()
         
         logger.info(f"Znaleziono {len(markdown_files)} plików Markdown")
         return markdown_files
     
-    def extract_code_blocks(self, content: str) -> List[Dict]:
-        """Wyodrębnia bloki kodu z pliku Markdown"""
-        code_blocks = []
-        
-        # Wzorce dla różnych formatów bloków kodu
-        patterns = [
-            # Format: ```language\n# path/to/file.ext\ncode```
-            r'```(\w+)\s*\n#\s*([^\n]+)\s*\n(.*?)```',
-            # Format: ```language\n// path/to/file.ext\ncode```
-            r'```(\w+)\s*\n//\s*([^\n]+)\s*\n(.*?)```',
-            # Format: ```yaml\n# path/to/file.yml\ncode```
-            r'```(yaml|yml)\s*\n#\s*([^\n]+\.ya?ml)\s*\n(.*?)```',
-            # Format dla plików konfiguracyjnych z komentarzem
-            r'```(\w+)\s*\n#\s*(\S+/[^\n]+)\s*\n(.*?)```',
-            # Format dla JavaScript/TypeScript
-            r'```(javascript|typescript|js|ts)\s*\n//\s*([^\n]+\.[jt]sx?)\s*\n(.*?)```',
-            # Format dla Pythona
-            r'```python\s*\n#\s*([^\n]+\.py)\s*\n(.*?)```',
-            # Format dla bash/shell
-            r'```(?:bash|sh|shell)\s*\n#(?:!/bin/bash\s*)?\s*\n#\s*([^\n]+\.sh)\s*\n(.*?)```',
-        ]
+    def register_path_rule(self, rule: Dict, index: Optional[int] = None):
+        """Dodaje regułę rozpoznawania ścieżki (domyślnie na koniec tabeli)"""
+        if index is None:
+            self.path_rules.append(rule)
+        else:
+            self.path_rules.insert(index, rule)
+    
+    def match_path_rule(self, block: Dict) -> Optional[Tuple[int, Dict]]:
+        """Dopasowuje blok kodu do pierwszej pasującej reguły z tabeli"""
+        language = block['language']
+        lines = block['lines']
         
-        for pattern in patterns:
-            matches = re.finditer(pattern, content, re.DOTALL | re.MULTILINE)
-            for match in matches:
-                if len(match.groups()) == 3:
-                    language, filepath, code = match.groups()
-                else:
-                    language = match.group(1) if len(match.groups()) >= 1 else 'text'
-                    filepath = match.group(2) if len(match.groups()) >= 2 else match.group(1)
-                    code = match.group(3) if len(match.groups()) >= 3 else match.group(2)
-                
-                # Czyszczenie ścieżki
-                filepath = filepath.strip()
-                if filepath.startswith('./'):
-                    filepath = filepath[2:]
-                
-                # Pomijamy bloki bez określonej ścieżki pliku
-                if '/' in filepath or '.' in filepath:
-                    code_blocks.append({
-                        'language': language,
-                        'filepath': filepath,
-                        'code': code.strip()
-                    })
+        # Pierwsza niepusta linia bloku jest kandydatem na nagłówek ze ścieżką;
+        # shebang nie jest ścieżką, więc nagłówka szukamy w linii po nim
+        header_idx = 0
+        while header_idx < len(lines) and not lines[header_idx].strip():
+            header_idx += 1
+        shebang = None
+        if header_idx < len(lines) and lines[header_idx].startswith('#!'):
+            shebang = header_idx
+            header_idx += 1
+        header = lines[header_idx].strip() if header_idx < len(lines) else ''
         
-        # Specjalne przetwarzanie dla docker-compose i innych plików YAML
-        yaml_pattern = r'```yaml\s*\n(.*?)```'
-        yaml_matches = re.finditer(yaml_pattern, content, re.DOTALL)
-        
-        for match in yaml_matches:
-            code = match.group(1)
-            # Szukamy komentarzy ze ścieżką w pierwszych liniach
-            lines = code.split('\n')
-            if lines and lines[0].startswith('#'):
-                filepath_match = re.match(r'#\s*(.+\.(yml|yaml|json|env|sh|js|ts|py|md))', lines[0])
-                if filepath_match:
-                    filepath = filepath_match.group(1).strip()
-                    actual_code = '\n'.join(lines[1:]).strip()
-                    code_blocks.append({
-                        'language': 'yaml',
-                        'filepath': filepath,
-                        'code': actual_code
-                    })
+        profiling = self.profiler.enabled
+        for priority, rule in enumerate(self.path_rules):
+            languages = rule.get('languages')
+            if languages is not None and language.lower() not in languages:
+                continue
+            
+            started = time.perf_counter() if profiling else 0.0
+            if rule['source'] == 'heading':
+                if not block['heading']:
+                    continue
+                match = rule['pattern'].search(block['heading'])
+                code_lines = lines
+            else:
+                if not header:
+                    continue
+                match = rule['pattern'].match(header)
+                code_lines = lines[header_idx + 1:]
+                if shebang is not None:
+                    code_lines = [lines[shebang]] + code_lines
+            if profiling:
+                self.profiler.record_rule(rule['name'], time.perf_counter() - started, match is not None)
+            
+            if not match:
+                continue
+            
+            # Czyszczenie ścieżki
+            filepath = match.group(1).strip()
+            if not filepath or filepath.startswith('#'):
+                continue
+            # Pomijamy komentarze, które nie wyglądają na ścieżkę pliku
+            if rule.get('strict') and '/' not in filepath and '.' not in filepath:
+                continue
+            filepath = normalize_output_path(filepath)
+            if filepath is None:
+                logger.debug(f"⏭️  Pominięto ścieżkę poza folderem docelowym: {match.group(1).strip()}")
+                continue
+            
+            if profiling:
+                self.profiler.record_hit(rule['name'])
+            return priority, {
+                'language': rule.get('language') or language,
+                'filepath': filepath,
+                'code': ''.join(code_lines).strip(),
+                'line': block['line']
+            }
         
-        return code_blocks
+        return None
+    
+    def iter_code_blocks(self, lines: Iterable[str]) -> Iterator[Tuple[int, Dict]]:
+        """Zwraca (priorytet reguły, definicja pliku) dla każdego rozpoznanego bloku"""
+        for block in iter_fenced_blocks(lines):
+            matched = self.match_path_rule(block)
+            if matched:
+                yield matched
+    
+    def extract_code_blocks(self, content: str) -> List[Dict]:
+        """Wyodrębnia bloki kodu z pliku Markdown"""
+        return [
+            file_def
+            for _, file_def in self.iter_code_blocks(content.splitlines(keepends=True))
+        ]
     
     def extract_file_definitions(self, content: str) -> List[Dict]:
         """Wyodrębnia definicje plików z różnych formatów w Markdown"""
-        files = []
-        
-        # Dodatkowe wzorce dla specyficznych przypadków
-        special_patterns = [
-            # Format: ### Plik: path/to/file.ext
-            r'###?\s*(?:Plik|File|Config|Configuration):\s*`?([^\n`]+)`?\s*\n```(\w+)\s*\n(.*?)```',
-            # Format dla package.json i innych JSON-ów
-            r'```json\s*\n(?://|#)?\s*([^\n]+\.json)\s*\n(.*?)```',
-            # Format dla .env
-            r'```(?:bash|text|env)\s*\n#\s*([^\n]*\.env(?:\.\w+)?)\s*\n(.*?)```',
-            # Format dla Dockerfile
-            r'```dockerfile\s*\n#\s*([^\n]*Dockerfile[^\n]*)\s*\n(.*?)```',
-        ]
-        
-        for pattern in special_patterns:
-            matches = re.finditer(pattern, content, re.DOTALL | re.MULTILINE)
-            for match in matches:
-                if len(match.groups()) == 3:
-                    filepath, language, code = match.groups()
-                else:
-                    filepath = match.group(1)
-                    code = match.group(2) if len(match.groups()) > 1 else ''
-                    language = 'text'
-                
-                filepath = filepath.strip()
-                if filepath and not filepath.startswith('#'):
-                    files.append({
-                        'language': language,
-                        'filepath': filepath,
-                        'code': code.strip()
-                    })
-        
-        # Wyodrębnianie zwykłych bloków kodu
-        code_blocks = self.extract_code_blocks(content)
-        files.extend(code_blocks)
+        return self.extract_file_definitions_from_lines(content.splitlines(keepends=True))
+    
+    def extract_file_definitions_from_lines(self, lines: Iterable[str]) -> List[Dict]:
+        """Wyodrębnia definicje plików z linii dokumentu czytanych strumieniowo"""
+        # Kolejność kandydatów jak przy kolejnych przebiegach wzorców:
+        # najpierw według priorytetu reguły, potem według pozycji w dokumencie
+        candidates = sorted(
+            self.iter_code_blocks(lines),
+            key=lambda candidate: candidate[0]
+        )
         
         # Usuwanie duplikatów
         seen = set()
         unique_files = []
-        for file_def in files:
+        for _, file_def in candidates:
             filepath = file_def['filepath']
             if filepath not in seen:
                 seen.add(filepath)
@@ -164,8 +1012,85 @@ class ProjectBuilder:
         
         return unique_files
     
-    def create_file_structure(self, file_definitions: List[Dict]):
-        """Tworzy strukturę plików i katalogów"""
+    def load_manifest(self) -> Dict:
+        """Wczytuje manifest poprzedniego budowania (pusty przy braku lub innej wersji)"""
+        empty = {'version': MANIFEST_VERSION, 'sources': {}, 'outputs': {}}
+        manifest_path = self.output_dir / MANIFEST_NAME
+        if not self.incremental or not manifest_path.exists():
+            return empty
+        
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Nie można wczytać manifestu, pełne budowanie: {e}")
+            return empty
+        
+        if manifest.get('version') != MANIFEST_VERSION:
+            return empty
+        return manifest
+    
+    def save_manifest(self):
+        """Zapisuje manifest budowania (tylko jeśli się zmienił)"""
+        if self.archive_path:
+            return
+        content = json.dumps(self.manifest, indent=2, sort_keys=True, ensure_ascii=False)
+        self.write_if_changed(self.output_dir / MANIFEST_NAME, content)
+    
+    def write_if_changed(self, path: Path, content: str) -> bool:
+        """Zapisuje plik tylko gdy treść jest inna, aby nie zmieniać jego mtime"""
+        if not self.archive_path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    if f.read() == content:
+                        return False
+            except (OSError, UnicodeDecodeError):
+                pass
+        
+        self.writer.write_file(path, content)
+        return True
+    
+    def output_exists(self, path: Path) -> bool:
+        """Sprawdza, czy plik wynikowy już istnieje (na dysku lub w archiwum)"""
+        if self.archive_path:
+            return path in self.writer.files
+        return path.exists()
+    
+    def source_key(self, md_file: Path) -> str:
+        """Klucz pliku źródłowego w manifeście (ścieżka względna)"""
+        try:
+            return md_file.relative_to(self.source_dir).as_posix()
+        except ValueError:
+            return md_file.as_posix()
+    
+    def check_source(self, md_file: Path) -> Tuple[Optional[Dict], bool]:
+        """Zwraca wpis manifestu dla pliku źródłowego i informację, czy się nie zmienił"""
+        stat = md_file.stat()
+        entry = {'hash': None, 'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'outputs': []}
+        previous = self.previous_manifest['sources'].get(self.source_key(md_file))
+        
+        # Szybka ścieżka: ten sam rozmiar i mtime - bez czytania pliku
+        if previous and previous['size'] == entry['size'] and previous['mtime'] == entry['mtime']:
+            entry.update(hash=previous['hash'], outputs=previous['outputs'])
+            return entry, True
+        
+        entry['hash'] = hash_file(md_file)
+        if previous and previous['hash'] == entry['hash']:
+            entry['outputs'] = previous['outputs']
+            return entry, True
+        return entry, False
+    
+    def output_record(self, filepath: str) -> Optional[Dict]:
+        """Zwraca wpis manifestu opisujący aktualną treść pliku wynikowego na dysku"""
+        return self.manifest['outputs'].get(filepath) or self.previous_manifest['outputs'].get(filepath)
+    
+    def is_output_current(self, filepath: str, full_path: Path, digest: str) -> bool:
+        """Sprawdza, czy plik wynikowy ma już na dysku tę samą treść"""
+        previous = self.output_record(filepath)
+        return bool(previous) and previous['hash'] == digest and full_path.exists()
+    
+    def create_file_structure(self, file_definitions: Iterable[Dict]):
+        """Tworzy strukturę plików i katalogów (definicje mogą napływać strumieniowo)"""
         for file_def in file_definitions:
             filepath = file_def['filepath']
             code = file_def['code']
@@ -175,36 +1100,52 @@ class ProjectBuilder:
             full_path = self.output_dir / filepath
             
             try:
-                # Tworzenie katalogów
-                full_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Śledzenie utworzonych katalogów
-                if str(full_path.parent) not in self.dirs_created:
-                    self.dirs_created.append(str(full_path.parent))
-                    self.stats['dirs_created'] += 1
-                
-                # Określanie trybu zapisu na podstawie typu pliku
-                mode = 'w'
-                encoding = 'utf-8'
-                
                 # Specjalne przetwarzanie dla różnych typów plików
-                content = self.process_file_content(code, language, filepath)
-                
-                # Zapisywanie pliku
-                with open(full_path, mode, encoding=encoding) as f:
-                    f.write(content)
+                with self.profiler.phase('process'):
+                    content = self.process_file_content(code, language, filepath)
                 
-                # Ustawianie uprawnień dla skryptów
-                if filepath.endswith('.sh') or 'bin/' in filepath:
-                    os.chmod(full_path, 0o755)
+                # Pomijamy pliki, których treść się nie zmieniła (bez zmiany mtime)
+                digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+                current = self.is_output_current(filepath, full_path, digest)
+                self.manifest['outputs'][filepath] = {'hash': digest, 'source': file_def.get('source')}
+                if current:
+                    self.stats['files_unchanged'] += 1
+                    logger.debug(f"⏭️  Bez zmian: {filepath}")
+                    continue
                 
-                self.files_created.append(str(full_path))
-                self.stats['files_created'] += 1
-                logger.info(f"✅ Utworzono: {filepath}")
+                self.write_output(filepath, content)
                 
             except Exception as e:
                 self.stats['errors'] += 1
+                self.manifest['outputs'].pop(filepath, None)
                 logger.error(f"❌ Błąd przy tworzeniu {filepath}: {e}")
+        
+        # Oczekiwanie na zapisy z puli wątków
+        self.writer.flush()
+    
+    def write_output(self, filepath: str, content: str):
+        """Zleca zapis pliku wynikowego (katalog tworzony raz, zapis w puli wątków)"""
+        full_path = self.output_dir / filepath
+        
+        # Tworzenie katalogów (każdy katalog tylko raz)
+        if self.writer.ensure_dir(full_path.parent):
+            self.dirs_created.add(str(full_path.parent))
+            self.stats['dirs_created'] += 1
+        
+        # Uprawnienia wykonywania dla skryptów
+        self.writer.submit(filepath, full_path, content, is_executable(filepath))
+    
+    def finish_write(self, filepath: str, full_path: Path, error: Optional[Exception]):
+        """Rejestruje wynik zapisu pliku (wywoływane w wątku głównym)"""
+        if error is not None:
+            self.stats['errors'] += 1
+            self.manifest['outputs'].pop(filepath, None)
+            logger.error(f"❌ Błąd przy tworzeniu {filepath}: {error}")
+            return
+        
+        self.files_created.append(str(full_path))
+        self.stats['files_created'] += 1
+        logger.info(f"✅ Utworzono: {filepath}")
     
     def process_file_content(self, code: str, language: str, filepath: str) -> str:
         """Przetwarza zawartość pliku przed zapisaniem"""
@@ -253,21 +1194,25 @@ class ProjectBuilder:
         
         for dir_path in base_dirs:
             full_path = self.output_dir / dir_path
+            if self.archive_path:
+                if self.writer.ensure_dir(full_path):
+                    logger.info(f"📁 Utworzono katalog: {dir_path}")
+                continue
+            if full_path.is_dir():
+                continue
             full_path.mkdir(parents=True, exist_ok=True)
             logger.info(f"📁 Utworzono katalog: {dir_path}")
         
         # Tworzenie pliku README jeśli nie istnieje
         readme_path = self.output_dir / 'README.md'
-        if not readme_path.exists():
-            with open(readme_path, 'w') as f:
-                f.write(self.generate_readme())
+        if not self.output_exists(readme_path):
+            self.writer.write_file(readme_path, self.generate_readme())
             logger.info("📝 Utworzono README.md")
         
         # Tworzenie .gitignore
         gitignore_path = self.output_dir / '.gitignore'
-        if not gitignore_path.exists():
-            with open(gitignore_path, 'w') as f:
-                f.write(self.generate_gitignore())
+        if not self.output_exists(gitignore_path):
+            self.writer.write_file(gitignore_path, self.generate_gitignore())
             logger.info("📝 Utworzono .gitignore")
     
     def generate_readme(self) -> str:
@@ -388,7 +1333,13 @@ temp/
     
     def create_makefile(self):
         """Tworzy Makefile dla łatwego zarządzania projektem"""
-        makefile_content = """# MCP Manager Makefile
+        makefile_path = self.output_dir / 'Makefile'
+        if self.write_if_changed(makefile_path, self.generate_makefile()):
+            logger.info("📝 Utworzono Makefile")
+    
+    def generate_makefile(self) -> str:
+        """Generuje zawartość pliku Makefile"""
+        return """# MCP Manager Makefile
 
 .PHONY: help build start stop restart logs test clean
 
@@ -469,20 +1420,114 @@ ollama-models: ## Pobierz modele Ollama
 health: ## Sprawdź zdrowie usług
 	@./scripts/health-check.sh
 """
+    
+    def read_source(self, md_file: Path) -> Tuple[List[Dict], Optional[str], Optional[str]]:
+        """Czyta i parsuje plik Markdown - zwraca (definicje, skrót, błąd)"""
+        digest = hashlib.sha256()
+        try:
+            if not self.profiler.enabled:
+                # Wyodrębnianie definicji plików z linii czytanych przyrostowo
+                file_definitions = self.extract_file_definitions_from_lines(
+                    iter_source_lines(md_file, digest)
+                )
+                return file_definitions, digest.hexdigest(), None
+            
+            # Przy profilowaniu odczyt i parsowanie są rozdzielone, aby mierzyć je osobno
+            started = time.perf_counter()
+            with self.profiler.phase('read'):
+                lines = list(iter_source_lines(md_file, digest))
+            with self.profiler.phase('extract'):
+                file_definitions = self.extract_file_definitions_from_lines(lines)
+            self.profiler.record_document(
+                str(md_file), time.perf_counter() - started, md_file.stat().st_size
+            )
+            return file_definitions, digest.hexdigest(), None
+        except Exception as e:
+            return [], None, str(e)
+    
+    def iter_parsed_sources(self, items: List[Tuple[str, Path, Dict]]) -> Iterator[Tuple[str, List[Dict]]]:
+        """Parsuje pliki Markdown (równolegle przy jobs > 1), zwracając je po kolei"""
+        paths = [md_file for _, md_file, _ in items]
+        if self.document_cache is not None:
+            results = self.document_cache.iter_results(paths, self.read_sources)
+        else:
+            results = self.read_sources(paths)
         
-        makefile_path = self.output_dir / 'Makefile'
-        with open(makefile_path, 'w') as f:
-            f.write(makefile_content)
-        logger.info("📝 Utworzono Makefile")
+        for (key, md_file, entry), result in zip(items, results):
+            yield key, self.merge_parsed(key, md_file, entry, result)
+    
+    def read_sources(self, paths: List[Path]) -> Iterator[Tuple[List[Dict], Optional[str], Optional[str]]]:
+        """Wyniki read_source dla kolejnych plików (w procesach roboczych przy jobs > 1)"""
+        if self.jobs > 1 and len(paths) > 1:
+            return self.iter_parallel_results(paths)
+        return map(self.read_source, paths)
+    
+    def iter_parallel_results(self, paths: List[Path]) -> Iterator[Tuple[List[Dict], Optional[str], Optional[str]]]:
+        """Wysyła paczki plików do procesów roboczych i zwraca wyniki w kolejności"""
+        # Co najwyżej 2 paczki na proces w locie - ogranicza pamięć zajmowaną
+        # przez wyniki czekające na zapis, niezależnie od rozmiaru korpusu
+        chunksize = max(1, min(PIPELINE_CHUNK_SIZE, len(paths) // (self.jobs * 4)))
+        max_pending = self.jobs * 2
+        pending = deque()
+        
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(
+            max_workers=min(self.jobs, len(paths)),
+            initializer=_init_worker,
+            initargs=(type(self), self.path_rules, self.profiler.enabled)
+        ) as pool:
+            for start in range(0, len(paths), chunksize):
+                if len(pending) >= max_pending:
+                    yield from self.collect_worker_results(pending.popleft())
+                pending.append(pool.submit(_read_sources_in_worker, paths[start:start + chunksize]))
+            while pending:
+                yield from self.collect_worker_results(pending.popleft())
+    
+    def collect_worker_results(self, future) -> List[Tuple[List[Dict], Optional[str], Optional[str]]]:
+        """Odbiera wyniki paczki z procesu roboczego, scalając dane profilowania"""
+        results, profile = future.result()
+        if profile:
+            self.profiler.merge(profile)
+        return results
+    
+    def merge_parsed(self, key: str, md_file: Path, entry: Dict,
+                     result: Tuple[List[Dict], Optional[str], Optional[str]]) -> List[Dict]:
+        """Scala wynik parsowania ze statystykami i wpisem manifestu"""
+        file_definitions, digest, error = result
+        logger.info(f"📄 Przetwarzam: {md_file.name}")
+        self.stats['files_processed'] += 1
+        
+        if error is not None:
+            logger.error(f"❌ Błąd przy przetwarzaniu {md_file}: {error}")
+            self.stats['errors'] += 1
+            # Bez skrótu i mtime plik zostanie przeczytany przy kolejnym budowaniu
+            entry.update(hash=None, mtime=None)
+        else:
+            entry['hash'] = digest
+        
+        for file_def in file_definitions:
+            file_def['source'] = key
+        entry['outputs'] = [file_def['filepath'] for file_def in file_definitions]
+        return file_definitions
+    
+    def iter_owned_definitions(self, items: List[Tuple[str, Path, Dict]],
+                               owns: Callable[[str, str], bool]) -> Iterator[Dict]:
+        """Strumień definicji plików, które dane źródło powinno zapisać"""
+        for key, file_definitions in self.iter_parsed_sources(items):
+            for file_def in file_definitions:
+                if owns(file_def['filepath'], key):
+                    yield file_def
     
     def build(self):
         """Główna metoda budująca projekt"""
         logger.info(f"🏗️  Rozpoczynam budowanie projektu...")
         logger.info(f"📂 Folder źródłowy: {self.source_dir}")
-        logger.info(f"📂 Folder docelowy: {self.output_dir}")
-        
-        # Tworzenie głównego katalogu
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.archive_path:
+            logger.info(f"📦 Archiwum docelowe: {self.archive_path} ({self.output_format})")
+        else:
+            logger.info(f"📂 Folder docelowy: {self.output_dir}")
+            # Tworzenie głównego katalogu
+            self.output_dir.mkdir(parents=True, exist_ok=True)
         
         # Skanowanie plików Markdown
         markdown_files = self.scan_markdown_files()
@@ -491,39 +1536,398 @@ health: ## Sprawdź zdrowie usług
             logger.error("❌ Nie znaleziono plików Markdown!")
             return False
         
-        # Przetwarzanie każdego pliku
-        all_file_definitions = []
-        for md_file in markdown_files:
-            logger.info(f"📄 Przetwarzam: {md_file.name}")
-            self.stats['files_processed'] += 1
-            
-            try:
-                with open(md_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Wyodrębnianie definicji plików
-                file_definitions = self.extract_file_definitions(content)
-                all_file_definitions.extend(file_definitions)
-                
-            except Exception as e:
-                logger.error(f"❌ Błąd przy przetwarzaniu {md_file}: {e}")
-                self.stats['errors'] += 1
+        self.previous_manifest = self.load_manifest()
         
         # Tworzenie struktury projektu
         self.create_project_structure()
         
         # Tworzenie plików
-        if all_file_definitions:
-            logger.info(f"🔨 Tworzę {len(all_file_definitions)} plików...")
-            self.create_file_structure(all_file_definitions)
+        self.sync_sources(markdown_files)
+        failed = self.precedence == 'error' and bool(self.collisions)
         
         # Tworzenie Makefile
         self.create_makefile()
         
+        # Zapis manifestu dla kolejnego budowania przyrostowego
+        self.save_manifest()
+        
         # Generowanie raportu
         self.generate_report()
         
-        return True
+        # Domknięcie zapisów (przy archiwum - zapis katalogu centralnego / końca tar)
+        self.writer.close()
+        
+        return not failed
+    
+    def sync_sources(self, markdown_files: List[Path], changed: Optional[set] = None):
+        """Parsuje zmienione pliki Markdown i zapisuje ich pliki wynikowe.
+        
+        Bez listy `changed` każdy plik jest sprawdzany względem manifestu
+        (mtime, rozmiar, skrót); z listą (tryb --watch) sprawdzane są tylko
+        podane klucze źródeł, a pozostałe są brane z manifestu bez stat().
+        """
+        self.manifest = {'version': MANIFEST_VERSION, 'sources': {}, 'outputs': {}}
+        previous_sources = self.previous_manifest['sources']
+        
+        # Klasyfikacja plików: niezmienione (wg manifestu) są pomijane
+        sources = {}
+        paths = {}
+        to_parse = []
+        for md_file in markdown_files:
+            key = self.source_key(md_file)
+            paths[key] = md_file
+            if changed is not None and key not in changed and key in previous_sources:
+                sources[key] = dict(previous_sources[key])
+                continue
+            try:
+                entry, unchanged = self.check_source(md_file)
+            except OSError as e:
+                logger.error(f"❌ Błąd przy przetwarzaniu {md_file}: {e}")
+                self.stats['errors'] += 1
+                continue
+            
+            sources[key] = entry
+            if not unchanged:
+                to_parse.append((key, md_file, entry))
+        
+        # Źródła są przeglądane w kolejności pierwszeństwa, a plik wynikowy
+        # należy do pierwszego źródła, które go zgłosi - dzięki temu każdy plik
+        # jest zapisywany dokładnie raz. Pliki niezmienionych źródeł są znane
+        # z manifestu, więc te źródła zgłaszają je bez parsowania
+        self.reset_output_index()
+        order = self.precedence_order(list(sources))
+        parsed_keys = {key for key, _, _ in to_parse}
+        by_key = {item[0]: item for item in to_parse}
+        parsed = self.iter_parsed_sources([by_key[key] for key in order if key in parsed_keys])
+        
+        def iter_claimed_definitions() -> Iterator[Dict]:
+            for key in order:
+                if key not in parsed_keys:
+                    for filepath in sources[key]['outputs']:
+                        self.claim_output(filepath, key)
+                    continue
+                _, file_definitions = next(parsed)
+                for file_def in file_definitions:
+                    if self.claim_output(file_def['filepath'], key):
+                        yield file_def
+        
+        # Skan → parsowanie → zapis jako jeden strumień
+        if to_parse:
+            logger.info("🔨 Tworzę pliki...")
+        self.create_file_structure(iter_claimed_definitions())
+        owners = self.output_index
+        
+        # Niezmienione źródła trzeba przeczytać ponownie, jeśli przejęły plik
+        # po innym źródle albo ich plik wynikowy zniknął z dysku
+        to_parse = []
+        for key, entry in sources.items():
+            if key in parsed_keys:
+                continue
+            for filepath in entry['outputs']:
+                record = self.output_record(filepath)
+                if owners[filepath] == key and (
+                    not record or record['source'] != key
+                    or (changed is None and not (self.output_dir / filepath).exists())
+                ):
+                    to_parse.append((key, paths[key], entry))
+                    break
+            else:
+                self.stats['files_skipped'] += 1
+                for filepath in entry['outputs']:
+                    if owners[filepath] == key:
+                        self.manifest['outputs'][filepath] = self.output_record(filepath)
+        
+        self.create_file_structure(
+            self.iter_owned_definitions(to_parse, lambda filepath, key: owners[filepath] == key)
+        )
+        
+        # Manifest opisuje tylko pliki, które nadal mają właściciela
+        self.manifest['sources'] = sources
+        self.manifest['outputs'] = {
+            filepath: record
+            for filepath, record in self.manifest['outputs'].items()
+            if filepath in owners
+        }
+        self.log_collisions()
+    
+    def reset_output_index(self):
+        """Czyści globalny indeks plików wynikowych (ścieżka → źródło) i listę kolizji"""
+        self.output_index = {}
+        self.collisions = {}
+    
+    def precedence_order(self, keys: List[str]) -> List[str]:
+        """Kolejność, w jakiej źródła zgłaszają pliki wynikowe (wg polityki pierwszeństwa)"""
+        if self.precedence == 'last':
+            return list(reversed(keys))
+        return list(keys)
+    
+    def claim_output(self, filepath: str, key: str) -> bool:
+        """Zgłasza plik wynikowy dla źródła; False, jeśli należy już do innego źródła"""
+        owner = self.output_index.setdefault(filepath, key)
+        if owner == key:
+            return True
+        self.collisions.setdefault(filepath, [owner]).append(key)
+        return False
+    
+    def log_collisions(self):
+        """Raportuje pliki definiowane przez kilka źródeł"""
+        self.stats['collisions'] = len(self.collisions)
+        for filepath, keys in sorted(self.collisions.items()):
+            message = f"Kolizja: {filepath} - użyto {keys[0]}, pominięto {', '.join(keys[1:])}"
+            if self.precedence == 'error':
+                logger.error(f"❌ {message}")
+            else:
+                logger.warning(f"⚠️  {message}")
+        if self.precedence == 'error':
+            self.stats['errors'] += len(self.collisions)
+    
+    def watch(self, poll_interval: float = WATCH_POLL_INTERVAL):
+        """Tryb --watch: obserwuje folder źródłowy i przebudowuje zmienione pliki"""
+        watcher = create_watcher(self.source_dir, self.output_dir, poll_interval)
+        markdown_files = self.scan_markdown_files()
+        known = {self.source_key(md_file) for md_file in markdown_files}
+        logger.info(f"👀 Obserwuję {self.source_dir} ({type(watcher).__name__}) - Ctrl+C kończy")
+        
+        try:
+            while True:
+                changed_paths = watcher.wait()
+                if not changed_paths:
+                    continue
+                started = time.perf_counter()
+                changed = {self.source_key(path) for path in changed_paths}
+                
+                # Nowe lub usunięte pliki zmieniają kolejność źródeł - ponowny skan
+                if not changed <= known or not all(path.exists() for path in changed_paths):
+                    markdown_files = self.scan_markdown_files()
+                    known = {self.source_key(md_file) for md_file in markdown_files}
+                
+                for name in self.stats:
+                    self.stats[name] = 0
+                self.files_created = []
+                self.dirs_created = set()
+                self.previous_manifest = self.manifest
+                self.sync_sources(markdown_files, changed)
+                self.save_manifest()
+                
+                elapsed = (time.perf_counter() - started) * 1000
+                logger.info(
+                    f"🔁 Przebudowano {len(changed)} plik(ów) Markdown w {elapsed:.0f} ms "
+                    f"(utworzono: {self.stats['files_created']}, bez zmian: {self.stats['files_unchanged']}, "
+                    f"błędy: {self.stats['errors']})"
+                )
+        except KeyboardInterrupt:
+            logger.info("👋 Zakończono obserwowanie")
+        finally:
+            watcher.close()
+    
+    def plan(self) -> Optional[Dict]:
+        """Faza planowania: ekstrakcja w pamięci i porównanie z dyskiem, bez zapisu.
+        
+        Zwraca plan z listą plików (create / modify / unchanged, z różnicą
+        rozmiaru w bajtach), kolizjami ścieżek i wpisami źródeł do manifestu.
+        Treść plików jest trzymana w planie, aby apply() nie parsował ponownie.
+        """
+        markdown_files = self.scan_markdown_files()
+        if not markdown_files:
+            logger.error("❌ Nie znaleziono plików Markdown!")
+            return None
+        
+        self.previous_manifest = self.load_manifest()
+        items = self.source_items(markdown_files)
+        definitions = self.collect_definitions(items)
+        
+        files = []
+        for filepath in sorted(definitions):
+            file_def = definitions[filepath]
+            with self.profiler.phase('process'):
+                content = self.process_file_content(file_def['code'], file_def['language'], filepath)
+            files.append(self.plan_output(filepath, content, file_def['source']))
+        
+        # Pliki generowane przez builder (README i .gitignore nie są nadpisywane)
+        for filepath, content in (('README.md', self.generate_readme()),
+                                  ('.gitignore', self.generate_gitignore()),
+                                  ('Makefile', self.generate_makefile())):
+            if filepath in definitions:
+                continue
+            file_plan = self.plan_output(filepath, content, None)
+            if filepath != 'Makefile' and file_plan['action'] == 'modify':
+                file_plan.update(action='unchanged', delta=0, content=None)
+            files.append(file_plan)
+        
+        collisions = [
+            {'path': filepath, 'type': 'duplicate', 'sources': keys, 'owner': keys[0]}
+            for filepath, keys in sorted(self.collisions.items())
+        ]
+        # Plik, którego ścieżka jest katalogiem innego pliku wynikowego
+        for filepath in sorted(definitions):
+            for parent in Path(filepath).parents:
+                if parent.as_posix() in definitions:
+                    collisions.append({
+                        'path': filepath, 'type': 'file-dir',
+                        'sources': [definitions[parent.as_posix()]['source'], definitions[filepath]['source']],
+                        'owner': None
+                    })
+        
+        summary = {action: 0 for action in ('create', 'modify', 'unchanged')}
+        for file_plan in files:
+            summary[file_plan['action']] += 1
+        summary['collisions'] = len(collisions)
+        self.stats['collisions'] = len(self.collisions)
+        summary['bytes_delta'] = sum(file_plan['delta'] for file_plan in files)
+        
+        return {
+            'source_dir': str(self.source_dir),
+            'output_dir': str(self.output_dir),
+            'summary': summary,
+            'files': files,
+            'collisions': collisions,
+            'sources': {key: entry for key, _, entry in items},
+        }
+    
+    def source_items(self, markdown_files: List[Path]) -> List[Tuple[str, Path, Dict]]:
+        """Klucze i świeże wpisy manifestu dla plików Markdown (bez porównania z manifestem)"""
+        items = []
+        for md_file in markdown_files:
+            stat = md_file.stat()
+            entry = {'hash': None, 'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'outputs': []}
+            items.append((self.source_key(md_file), md_file, entry))
+        return items
+    
+    def collect_definitions(self, items: List[Tuple[str, Path, Dict]]) -> Dict[str, Dict]:
+        """Parsuje wszystkie źródła i zwraca definicje plików (ścieżka → definicja)
+        z właścicielem wybranym wg polityki pierwszeństwa, jak przy budowaniu"""
+        self.reset_output_index()
+        by_key = {item[0]: item for item in items}
+        order = self.precedence_order(list(by_key))
+        definitions = {}
+        for key, file_definitions in self.iter_parsed_sources([by_key[key] for key in order]):
+            for file_def in file_definitions:
+                if self.claim_output(file_def['filepath'], key):
+                    definitions[file_def['filepath']] = file_def
+        return definitions
+    
+    def virtual_tree(self, generated: bool = True) -> Optional[VirtualTree]:
+        """API biblioteczne: drzewo projektu w pamięci, bez zapisu na dysk.
+        
+        Pliki Markdown są parsowane od razu, ale process_file_content jest
+        uruchamiane dopiero przy odczycie treści danego pliku. Z `generated`
+        drzewo zawiera też README.md, .gitignore i Makefile (jeśli nie są
+        zdefiniowane w Markdown). Zwraca None, gdy brak plików Markdown.
+        """
+        markdown_files = self.scan_markdown_files()
+        if not markdown_files:
+            return None
+        
+        definitions = self.collect_definitions(self.source_items(markdown_files))
+        files = {
+            filepath: VirtualFile(
+                filepath, file_def['language'], file_def['source'], file_def.get('line'),
+                partial(self.process_file_content, file_def['code'], file_def['language'], filepath)
+            )
+            for filepath, file_def in definitions.items()
+        }
+        
+        if generated:
+            for filepath, language, render in (('README.md', 'markdown', self.generate_readme),
+                                               ('.gitignore', None, self.generate_gitignore),
+                                               ('Makefile', 'makefile', self.generate_makefile)):
+                if filepath not in files:
+                    files[filepath] = VirtualFile(filepath, language, None, None, render)
+        
+        self.stats['collisions'] = len(self.collisions)
+        return VirtualTree(files, dict(self.collisions))
+    
+    def plan_output(self, filepath: str, content: str, source: Optional[str]) -> Dict:
+        """Porównuje planowaną treść pliku z plikiem na dysku"""
+        data = content.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        file_plan = {
+            'path': filepath, 'action': 'create', 'source': source,
+            'hash': digest, 'size': len(data), 'delta': len(data), 'content': content
+        }
+        # Archiwum jest zawsze tworzone od nowa
+        if self.archive_path:
+            return file_plan
+        
+        full_path = self.output_dir / filepath
+        try:
+            old_size = full_path.stat().st_size
+        except OSError:
+            return file_plan
+        
+        file_plan.update(action='modify', delta=len(data) - old_size)
+        if old_size == len(data):
+            record = self.previous_manifest['outputs'].get(filepath)
+            if record and record['hash'] == digest:
+                unchanged = True
+            else:
+                try:
+                    with open(full_path, 'rb') as f:
+                        unchanged = f.read() == data
+                except OSError:
+                    unchanged = False
+            if unchanged:
+                file_plan.update(action='unchanged', content=None)
+        return file_plan
+    
+    def apply(self, plan: Dict) -> bool:
+        """Faza wykonania: zapisuje pliki z planu, pomijając niezmienione"""
+        if not self.archive_path:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Plan katalogów - każdy tworzony raz, przed zleceniem zapisów
+        to_write = [file_plan for file_plan in plan['files'] if file_plan['action'] != 'unchanged']
+        self.stats['files_unchanged'] += len(plan['files']) - len(to_write)
+        try:
+            self.writer.ensure_dirs((self.output_dir / file_plan['path']).parent for file_plan in to_write)
+        except OSError as e:
+            logger.error(f"❌ Błąd przy tworzeniu katalogów: {e}")
+        
+        for file_plan in to_write:
+            try:
+                self.write_output(file_plan['path'], file_plan['content'])
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"❌ Błąd przy tworzeniu {file_plan['path']}: {e}")
+        self.writer.flush()
+        
+        # Katalogi bazowe (README i .gitignore już istnieją, więc nie są nadpisywane)
+        self.create_project_structure()
+        
+        self.manifest = {
+            'version': MANIFEST_VERSION,
+            'sources': plan['sources'],
+            'outputs': {
+                file_plan['path']: {'hash': file_plan['hash'], 'source': file_plan['source']}
+                for file_plan in plan['files'] if file_plan['source'] is not None
+            }
+        }
+        self.save_manifest()
+        self.generate_report()
+        self.writer.close()
+        return not (self.precedence == 'error' and self.collisions)
+    
+    def log_plan(self, plan: Dict):
+        """Wypisuje podsumowanie planu"""
+        icons = {'create': '➕', 'modify': '✏️ ', 'unchanged': '⏸️ '}
+        for file_plan in plan['files']:
+            message = f"{icons[file_plan['action']]} {file_plan['action']}: {file_plan['path']} ({file_plan['delta']:+d} B)"
+            if file_plan['action'] == 'unchanged':
+                logger.debug(message)
+            else:
+                logger.info(message)
+        
+        for collision in plan['collisions']:
+            logger.warning(
+                f"⚠️  Kolizja ({collision['type']}): {collision['path']} - {', '.join(map(str, collision['sources']))}"
+            )
+        
+        summary = plan['summary']
+        logger.info(
+            f"📋 Plan: {summary['create']} nowych, {summary['modify']} zmienionych, "
+            f"{summary['unchanged']} bez zmian, {summary['collisions']} kolizji "
+            f"({summary['bytes_delta']:+d} B)"
+        )
     
     def generate_report(self):
         """Generuje raport z budowania projektu"""
@@ -534,12 +1938,15 @@ health: ## Sprawdź zdrowie usług
 
 📊 Statystyki:
 ├─ Pliki Markdown przetworzone: {self.stats['files_processed']}
+├─ Pliki Markdown bez zmian: {self.stats['files_skipped']}
 ├─ Pliki utworzone: {self.stats['files_created']}
+├─ Pliki wynikowe bez zmian: {self.stats['files_unchanged']}
 ├─ Katalogi utworzone: {self.stats['dirs_created']}
+├─ Kolizje ścieżek: {self.stats['collisions']}
 └─ Błędy: {self.stats['errors']}
 
 📂 Struktura projektu utworzona w:
-   {self.output_dir}
+   {self.archive_path or self.output_dir}
 
 🚀 Następne kroki:
    1. cd {self.output_dir}
@@ -560,12 +1967,178 @@ health: ## Sprawdź zdrowie usług
         
         # Zapisz raport do pliku
         report_path = self.output_dir / 'BUILD_REPORT.txt'
-        with open(report_path, 'w') as f:
-            f.write(report)
-            f.write(f"\n\nCzas budowania: {datetime.now()}\n")
-            f.write("\nUtworzono pliki:\n")
-            for filepath in sorted(self.files_created):
-                f.write(f"  - {filepath}\n")
+        parts = [report, f"\n\nCzas budowania: {datetime.now()}\n"]
+        if self.collisions:
+            parts.append(f"\nKolizje ścieżek (polityka: {self.precedence}):\n")
+            for filepath, keys in sorted(self.collisions.items()):
+                parts.append(f"  - {filepath}: użyto {keys[0]}, pominięto {', '.join(keys[1:])}\n")
+        if self.profiler.enabled:
+            parts.append(self.profiler.format_report())
+        parts.append("\nUtworzono pliki:\n")
+        for filepath in sorted(self.files_created):
+            parts.append(f"  - {filepath}\n")
+        self.writer.write_file(report_path, "".join(parts))
+        
+        if self.profiler.enabled:
+            profile_path = self.output_dir / PROFILE_NAME
+            self.writer.write_file(profile_path, json.dumps(self.profiler.summary(), indent=2, ensure_ascii=False))
+            logger.info(f"⏱️  Zapisano profil budowania: {profile_path}")
+
+
+class BuildServer:
+    """Tryb --serve: ciepły proces przyjmujący żądania budowania w JSON-RPC 2.0
+    (jedna linia JSON = jedno żądanie) przez stdin/stdout lub gniazdo Unix.
+    
+    Metody: build (parametry jak opcje CLI, dry_run zwraca plan), ping, stats,
+    shutdown. Sparsowane pliki Markdown są trzymane w DocumentCache między
+    żądaniami, więc niezmienione dokumenty nie są ponownie czytane.
+    """
+    
+    BUILD_PARAMS = {'source', 'output', 'force', 'precedence', 'jobs', 'write_threads',
+                    'fsync', 'output_format', 'profile', 'profile_top', 'dry_run'}
+    
+    def __init__(self, cache_size: int = DOCUMENT_CACHE_SIZE):
+        self.cache = DocumentCache(cache_size)
+        self.running = True
+        self.requests = 0
+        self.methods = {
+            'build': self.build,
+            'ping': lambda params: 'pong',
+            'stats': self.server_stats,
+            'shutdown': self.shutdown,
+        }
+    
+    def build(self, params: Dict) -> Dict:
+        unknown = set(params) - self.BUILD_PARAMS
+        if unknown:
+            raise ValueError(f"Nieznane parametry: {', '.join(sorted(unknown))}")
+        source = params.get('source')
+        if not source or not os.path.isdir(source):
+            raise ValueError(f"Folder źródłowy nie istnieje: {source}")
+        precedence = params.get('precedence', 'last')
+        if precedence not in ('last', 'first', 'error'):
+            raise ValueError(f"Nieznana polityka pierwszeństwa: {precedence}")
+        output_format = params.get('output_format', 'dir')
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Nieznany format wyniku: {output_format}")
+        if output_format == 'tar.zst':
+            load_zstandard()
+        
+        builder = ProjectBuilder(
+            source, params.get('output'), incremental=not params.get('force', False),
+            jobs=params.get('jobs', 1), profile=params.get('profile', False),
+            profile_top=params.get('profile_top', 10), precedence=precedence,
+            write_threads=params.get('write_threads', WRITER_THREADS), fsync=params.get('fsync', False),
+            output_format=output_format, document_cache=self.cache
+        )
+        
+        if params.get('dry_run'):
+            plan = builder.plan()
+            return {
+                'success': plan is not None and not (precedence == 'error' and builder.collisions),
+                'plan': json.loads(plan_to_json(plan)) if plan else None,
+                'cache': self.cache.summary(),
+            }
+        
+        success = builder.build()
+        return {
+            'success': bool(success),
+            'output': str(builder.archive_path or builder.output_dir),
+            'stats': builder.stats,
+            'collisions': builder.collisions,
+            'cache': self.cache.summary(),
+        }
+    
+    def server_stats(self, params: Dict) -> Dict:
+        return {'requests': self.requests, 'cache': self.cache.summary()}
+    
+    def shutdown(self, params: Dict) -> bool:
+        self.running = False
+        return True
+    
+    def handle_line(self, line: str) -> Optional[Dict]:
+        """Obsługuje jedno żądanie; zwraca odpowiedź (None dla powiadomień)"""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32700, 'message': f"Błąd składni JSON: {e}"}}
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'Nieprawidłowe żądanie'}}
+        
+        request_id = request.get('id')
+        method = self.methods.get(request['method'])
+        params = request.get('params') or {}
+        self.requests += 1
+        if method is None:
+            error = {'code': -32601, 'message': f"Nieznana metoda: {request['method']}"}
+        elif not isinstance(params, dict):
+            error = {'code': -32602, 'message': 'Parametry muszą być obiektem'}
+        else:
+            started = time.perf_counter()
+            try:
+                # Baner raportu nie może trafić do strumienia odpowiedzi
+                with redirect_stdout(sys.stderr):
+                    result = method(params)
+            except ValueError as e:
+                error = {'code': -32602, 'message': str(e)}
+            except Exception as e:
+                logger.exception(f"❌ Błąd przy obsłudze żądania {request['method']}")
+                error = {'code': -32000, 'message': str(e)}
+            else:
+                logger.info(f"🛰️  {request['method']} obsłużone w {(time.perf_counter() - started) * 1000:.0f} ms")
+                if 'id' not in request:
+                    return None
+                return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+        
+        if 'id' not in request:
+            return None
+        return {'jsonrpc': '2.0', 'id': request_id, 'error': error}
+    
+    def serve_stdio(self):
+        """Żądania ze stdin, odpowiedzi na stdout (logi na stderr)"""
+        output = sys.stdout
+        logger.info("🛰️  Serwer buildera gotowy (stdin/stdout)")
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            response = self.handle_line(line)
+            if response is not None:
+                output.write(json.dumps(response, ensure_ascii=False) + "\n")
+                output.flush()
+            if not self.running:
+                break
+    
+    def serve_socket(self, path: str):
+        """Żądania przez gniazdo Unix; połączenia obsługiwane kolejno"""
+        import socketserver
+        server = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    response = server.handle_line(line.decode('utf-8'))
+                    if response is not None:
+                        self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8'))
+                        self.wfile.flush()
+                    if not server.running:
+                        break
+        
+        # Pozostałość po poprzednim procesie
+        if os.path.exists(path):
+            os.unlink(path)
+        try:
+            with socketserver.UnixStreamServer(path, Handler) as unix_server:
+                logger.info(f"🛰️  Serwer buildera gotowy: {path}")
+                while self.running:
+                    unix_server.handle_request()
+        except KeyboardInterrupt:
+            logger.info("👋 Zakończono pracę serwera")
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
 
 def main():
     """Główna funkcja programu"""
@@ -577,11 +2150,13 @@ Przykłady użycia:
   python build_project.py ./markdown-docs
   python build_project.py ./docs --output ./my-project
   python build_project.py . --verbose
+  python build_project.py --serve --socket /tmp/mcp-builder.sock
         """
     )
     
     parser.add_argument(
         'source',
+        nargs='?',
         help='Ścieżka do folderu z plikami Markdown'
     )
     
@@ -597,14 +2172,113 @@ Przykłady użycia:
         help='Tryb verbose - więcej informacji'
     )
     
+    parser.add_argument(
+        '--force', '-f',
+        action='store_true',
+        help='Pełne przebudowanie - ignoruje manifest poprzedniego budowania'
+    )
+    
+    parser.add_argument(
+        '--precedence',
+        choices=['last', 'first', 'error'],
+        default='last',
+        help='Który plik Markdown wygrywa, gdy kilka definiuje ten sam plik: '
+             'ostatni lub pierwszy (wg ścieżki), error = przerwij z błędem (domyślnie: last)'
+    )
+    
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Liczba procesów parsujących pliki Markdown (0 = liczba rdzeni, domyślnie: 1)'
+    )
+    
+    parser.add_argument(
+        '--write-threads',
+        type=int,
+        default=WRITER_THREADS,
+        metavar='N',
+        help=f'Liczba wątków zapisujących pliki (1 = zapis szeregowy, domyślnie: {WRITER_THREADS})'
+    )
+    
+    parser.add_argument(
+        '--fsync',
+        action='store_true',
+        help='Zbiorczy fsync zapisanych plików i katalogów na koniec budowania'
+    )
+    
+    parser.add_argument(
+        '--output-format',
+        choices=list(OUTPUT_FORMATS),
+        default='dir',
+        help='Format wyniku: katalog lub archiwum tar / tar.zst / zip zapisywane strumieniowo, '
+             'bez plików na dysku (archiwum budowane zawsze w całości, domyślnie: dir)'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help=f'Mierz czasy faz, reguł ścieżek i dokumentów (raport w BUILD_REPORT.txt i {PROFILE_NAME})'
+    )
+    
+    parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=10,
+        metavar='N',
+        help='Liczba najwolniejszych dokumentów w raporcie profilowania (domyślnie: 10)'
+    )
+    
+    parser.add_argument(
+        '--watch', '-w',
+        action='store_true',
+        help='Po zbudowaniu obserwuj pliki Markdown i przebudowuj tylko zmienione'
+    )
+    
     parser.add_argument(
         '--dry-run',
         action='store_true',
         help='Tylko pokaż co zostanie utworzone, bez tworzenia plików'
     )
     
+    parser.add_argument(
+        '--plan-json',
+        metavar='PLIK',
+        help='Zapisz plan budowania jako JSON (- = stdout); bez --dry-run plan jest następnie wykonywany'
+    )
+    
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Tryb serwera: ciepły proces przyjmujący żądania budowania JSON-RPC '
+             '(stdin/stdout lub --socket), z pamięcią podręczną sparsowanych dokumentów'
+    )
+    
+    parser.add_argument(
+        '--socket',
+        metavar='ŚCIEŻKA',
+        help='Gniazdo Unix dla --serve (domyślnie: stdin/stdout)'
+    )
+    
     args = parser.parse_args()
     
+    if args.serve:
+        if args.verbose:
+            logging.getLogger().setLevel(logging.DEBUG)
+        server = BuildServer()
+        if args.socket:
+            server.serve_socket(args.socket)
+        else:
+            server.serve_stdio()
+        return
+    
+    if args.source is None:
+        parser.error('wymagany argument: source')
+    
+    if args.watch and args.output_format != 'dir':
+        parser.error('--watch działa tylko z --output-format dir')
+    
     # Ustawienie poziomu logowania
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
@@ -614,20 +2288,54 @@ Przykłady użycia:
         logger.error(f"❌ Folder źródłowy nie istnieje: {args.source}")
         sys.exit(1)
     
-    # Budowanie projektu
-    builder = ProjectBuilder(args.source, args.output)
+    if args.output_format == 'tar.zst':
+        try:
+            load_zstandard()
+        except RuntimeError as e:
+            logger.error(f"❌ {e}")
+            sys.exit(1)
     
-    if args.dry_run:
-        logger.info("🔍 Tryb DRY RUN - tylko analiza, bez tworzenia plików")
-        # TODO: Implementacja dry run
+    # Budowanie projektu
+    builder = ProjectBuilder(
+        args.source, args.output, incremental=not args.force, jobs=args.jobs,
+        profile=args.profile, profile_top=args.profile_top, precedence=args.precedence,
+        write_threads=args.write_threads, fsync=args.fsync, output_format=args.output_format
+    )
     
-    success = builder.build()
+    if args.dry_run or args.plan_json:
+        if args.dry_run:
+            logger.info("🔍 Tryb DRY RUN - tylko analiza, bez tworzenia plików")
+        plan = builder.plan()
+        if plan is None:
+            logger.error("❌ Budowanie projektu zakończone niepowodzeniem!")
+            sys.exit(1)
+        builder.log_plan(plan)
+        
+        if args.plan_json == '-':
+            print(plan_to_json(plan))
+        elif args.plan_json:
+            with open(args.plan_json, 'w', encoding='utf-8') as f:
+                f.write(plan_to_json(plan))
+            logger.info(f"📝 Zapisano plan: {args.plan_json}")
+        
+        if args.dry_run:
+            if args.precedence == 'error' and builder.collisions:
+                sys.exit(1)
+            return
+        success = builder.apply(plan)
+    else:
+        success = builder.build()
     
     if not success:
         logger.error("❌ Budowanie projektu zakończone niepowodzeniem!")
         sys.exit(1)
     
     logger.info("✅ Budowanie projektu zakończone sukcesem!")
+    if builder.archive_path:
+        logger.info(f"📦 Zapisano archiwum: {builder.archive_path}")
+    
+    if args.watch:
+        builder.watch()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Sandbox side of python-executor: what runs inside an execution process,
+whether forked from a warm worker or started as a fresh interpreter with
+`python -c "import sandbox; sandbox.main()"`. Standard library only, so the
+fresh interpreter does not import the server (mcp, asyncio)."""
+
+import time
+import importlib
+import math
+import resource
+import mmap
+import json
+import os
+import sys
+
+
+def exec_code(code: str, namespace: dict, filename: str = '<execute_python>') -> int:
+    """Execute code in `namespace` with script semantics; returns the exit code"""
+    # Packages installed after the zygote started must be importable
+    importlib.invalidate_caches()
+    try:
+        exec(compile(code, filename, 'exec'), namespace)
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        import traceback
+        # Skip this frame so the traceback starts in the user's code
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1
+    return 0
+
+
+def apply_envelope(envelope: dict):
+    """Set up argv, environment, sys.path and the output directory of an
+    execution from its request envelope"""
+    sys.argv = ['<execute_python>'] + [str(arg) for arg in envelope.get('args') or []]
+    os.environ.update({str(name): str(value) for name, value in (envelope.get('env') or {}).items()})
+    if envelope.get('output_dir'):
+        os.chdir(envelope['output_dir'])
+        os.environ['OUTPUT_DIR'] = envelope['output_dir']
+    if envelope.get('path'):
+        sys.path[:0] = envelope['path']
+
+
+def map_data_inputs(paths: dict) -> dict:
+    """name -> read-only memoryview of the mapped file, so numpy.frombuffer
+    reads binary inputs without copying"""
+    views = {}
+    for name, path in paths.items():
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            views[name] = memoryview(mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else b'')
+    return views
+
+
+def data_output_factory(directory: str):
+    def data_output(name: str, size: int) -> memoryview:
+        """Writable buffer of `size` bytes mapped from a file that is returned to the client"""
+        if not name or '/' in name or name.startswith('.'):
+            raise ValueError(f"Invalid data output name: {name!r}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, name), 'w+b') as f:
+            f.truncate(size)
+            return memoryview(mmap.mmap(f.fileno(), size) if size else bytearray())
+    return data_output
+
+
+def script_namespace(envelope: dict) -> dict:
+    """Globals of a fresh script: a shared batch input is bound as INPUT, binary
+    data inputs as DATA and data_output() allocates binary outputs"""
+    namespace = {'__name__': '__main__', '__builtins__': __builtins__}
+    if 'input' in envelope:
+        namespace['INPUT'] = envelope['input']
+    if envelope.get('data') or envelope.get('data_dir'):
+        namespace['DATA'] = map_data_inputs(envelope.get('data') or {})
+    if envelope.get('data_dir'):
+        namespace['data_output'] = data_output_factory(envelope['data_dir'])
+    return namespace
+
+
+def apply_rlimits(limits: dict, cpu_used: float = None):
+    """Limit the calling process before user code runs. Hard limits are only
+    ever lowered, so in a long-lived kernel the first request fixes them and
+    the memory budget covers the kernel's whole state. Such a kernel passes
+    the CPU time used so far and gets a soft CPU limit for each request."""
+    def setrlimit(kind, soft, hard):
+        current = resource.getrlimit(kind)[1]
+        if current != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current), min(hard, current)
+        resource.setrlimit(kind, (soft, hard))
+    
+    if limits.get("memory"):
+        with open('/proc/self/statm') as f:
+            mapped = int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+        setrlimit(resource.RLIMIT_AS, mapped + limits["memory"], mapped + limits["memory"])
+    if limits.get("cpu_seconds"):
+        if cpu_used is None:
+            # SIGXCPU at the soft limit, SIGKILL a second later
+            setrlimit(resource.RLIMIT_CPU, limits["cpu_seconds"], limits["cpu_seconds"] + 1)
+        else:
+            # An unprivileged process cannot raise its hard limit for the next request
+            setrlimit(resource.RLIMIT_CPU, math.ceil(cpu_used) + limits["cpu_seconds"],
+                      resource.getrlimit(resource.RLIMIT_CPU)[1])
+    if limits.get("open_files"):
+        setrlimit(resource.RLIMIT_NOFILE, limits["open_files"], limits["open_files"])
+    if limits.get("processes"):
+        setrlimit(resource.RLIMIT_NPROC, limits["processes"], limits["processes"])
+
+
+def enter_cgroup(path: str, pid: int = 0):
+    """Move a process (0: the caller) into an execution cgroup"""
+    try:
+        with open(os.path.join(path, 'cgroup.procs'), 'w') as f:
+            f.write(str(pid))
+    except OSError:
+        pass
+
+
+def main():
+    """Fresh interpreter: read the request envelope from stdin, run it and write
+    the response to the fd given as the first argument"""
+    started = time.monotonic()
+    # Move the response pipe off the fd number the server passed, so user code
+    # is not handed it; the server only trusts the numbers it reads back
+    response_fd = os.dup(int(sys.argv[1]))
+    os.close(int(sys.argv[1]))
+    envelope = json.loads(sys.stdin.buffer.read())
+    limits = envelope.get('limits') or {}
+    if limits.get('cgroup_path'):
+        enter_cgroup(limits['cgroup_path'])
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    apply_envelope(envelope)
+    namespace = script_namespace(envelope)
+    apply_rlimits(limits)
+    returncode = exec_code(envelope['code'], namespace)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    os.write(response_fd, json.dumps({"started": started, "user_time": usage.ru_utime,
+                                      "system_time": usage.ru_stime, "peak_rss": usage.ru_maxrss * 1024}).encode())
+    os._exit(returncode)
@@ -3,46 +3,2236 @@
 from mcp import MCPServer
 import subprocess
 import tempfile
+import multiprocessing
+import importlib
+import importlib.metadata
+import hashlib
+import shutil
+import threading
+import ctypes
+import contextlib
+import logging
+import asyncio
+import codecs
+import select
+import signal
+import resource
+import time
+import io
+import base64
 import os
 import json
+import uuid
+import http.server
 import sys
+import re
+from collections import OrderedDict, deque
+from multiprocessing import shared_memory
+from sandbox import apply_envelope, apply_rlimits, enter_cgroup, exec_code, script_namespace
+
+logger = logging.getLogger("python-executor")
 
 server = MCPServer(
     name="python-executor",
     version="1.0.0"
 )
 
-@server.tool("execute_python")
-async def execute_python(code: str, pip_install: list = None):
-    """Execute Python code safely in a sandboxed environment"""
-    
-    # Install packages if needed
-    if pip_install:
-        for package in pip_install:
-            if package in os.environ.get('ALLOWED_MODULES', '').split(','):
-                subprocess.run([sys.executable, '-m', 'pip', 'install', package])
-    
-    # Create temp file
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-        f.write(code)
-        temp_file = f.name
-    
-    try:
-        # Execute with timeout
-        result = subprocess.run(
-            [sys.executable, temp_file],
-            capture_output=True,
-            text=True,
-            timeout=int(os.environ.get('EXECUTION_TIMEOUT', 30))
+# Warm worker pool (0 disables it and falls back to one interpreter per call)
+WORKER_POOL_SIZE = int(os.environ.get('WORKER_POOL_SIZE', os.cpu_count() or 2))
+WORKER_MAX_RUNS = int(os.environ.get('WORKER_MAX_RUNS', 100))
+
+# pip package name -> import name, for preloading ALLOWED_MODULES
+IMPORT_NAMES = {
+    'beautifulsoup4': 'bs4',
+    'scikit-learn': 'sklearn',
+    'pillow': 'PIL',
+    'pyyaml': 'yaml',
+    'python-dateutil': 'dateutil',
+}
+
+# Extra seconds the server waits for a worker past the execution timeout
+WORKER_GRACE = 5
+
+# Executions running at once; further requests wait in a FIFO queue of at
+# most MAX_QUEUE entries and are rejected beyond that
+MAX_CONCURRENCY = int(os.environ.get('MAX_CONCURRENCY', WORKER_POOL_SIZE or os.cpu_count() or 2))
+MAX_QUEUE = int(os.environ.get('MAX_QUEUE', 100))
+
+# Retained output per stream: half from the start, half from the end
+MAX_OUTPUT_BYTES = int(os.environ.get('MAX_OUTPUT_BYTES', 1024 * 1024))
+OUTPUT_CHUNK = 65536
+
+# Stateful sessions: cap on live sessions, idle eviction (seconds) and a budget
+# for their combined resident memory, enforced by evicting the least recently
+# used idle sessions
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', 8))
+SESSION_IDLE_TIMEOUT = float(os.environ.get('SESSION_IDLE_TIMEOUT', 600))
+SESSION_MEMORY_LIMIT = os.environ.get('SESSION_MEMORY_LIMIT', '2G')
+
+# pip_install package sets are installed once into cached overlay directories,
+# from WHEELHOUSE when set (offline), and evicted LRU beyond ENV_CACHE_SIZE.
+# A failed install is reported again without retrying for ENV_FAILURE_TTL seconds
+ENV_CACHE_DIR = os.environ.get('ENV_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'python-executor-envs'))
+ENV_CACHE_SIZE = os.environ.get('ENV_CACHE_SIZE', '5G')
+WHEELHOUSE = os.environ.get('WHEELHOUSE', '')
+ENV_FAILURE_TTL = float(os.environ.get('ENV_FAILURE_TTL', 60))
+
+# Opt-in memoization of execute_python results (cache=True): entries expire
+# after RESULT_CACHE_TTL seconds and are kept in memory and in RESULT_CACHE_DIR,
+# each store bounded LRU by size. A cached run works in its own directory under
+# OUTPUT_DIR/runs; the files it leaves there are its artifacts.
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 3600))
+RESULT_CACHE_MEMORY = os.environ.get('RESULT_CACHE_MEMORY', '64M')
+RESULT_CACHE_SIZE = os.environ.get('RESULT_CACHE_SIZE', '1G')
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'python-executor-results'))
+OUTPUT_DIR = os.environ.get('OUTPUT_DIR', '/outputs')
+# Per-run directories under OUTPUT_DIR (data/<id> for data outputs, runs/<id>
+# of cached runs) are removed RUN_OUTPUT_TTL seconds after their last use, and
+# least recently used first while together larger than RUN_OUTPUT_SIZE
+RUN_OUTPUT_TTL = float(os.environ.get('RUN_OUTPUT_TTL', 86400))
+RUN_OUTPUT_SIZE = os.environ.get('RUN_OUTPUT_SIZE', '2G')
+NOTEBOOK_DIR = os.environ.get('NOTEBOOK_DIR', '/notebooks')
+# A notebook kernel keeps a checkpoint process before every
+# NOTEBOOK_CHECKPOINT_EVERY-th cell, at most NOTEBOOK_CHECKPOINTS of them; a
+# rerun resumes from the nearest one before the first changed cell
+NOTEBOOK_CHECKPOINTS = max(1, int(os.environ.get('NOTEBOOK_CHECKPOINTS', 16)))
+NOTEBOOK_CHECKPOINT_EVERY = max(1, int(os.environ.get('NOTEBOOK_CHECKPOINT_EVERY', 4)))
+
+# Per-execution limits (0 disables one). MAX_MEMORY is the address space a run
+# may add to what the warm process already maps, and its cgroup memory.max;
+# MAX_PROCESSES is RLIMIT_NPROC (counted per user) and the cgroup pids.max.
+# A session gets one such budget for its whole state and CPU seconds per call.
+MAX_MEMORY = os.environ.get('MAX_MEMORY', '512M')
+MAX_CPU_SECONDS = int(os.environ.get('MAX_CPU_SECONDS', os.environ.get('EXECUTION_TIMEOUT', 30)))
+MAX_OPEN_FILES = int(os.environ.get('MAX_OPEN_FILES', 256))
+MAX_PROCESSES = int(os.environ.get('MAX_PROCESSES', 64))
+# Per-execution cgroup v2 groups when the server's cgroup can delegate them
+CGROUP_LIMITS = os.environ.get('CGROUP_LIMITS', '1') != '0'
+
+# Prometheus metrics on their own HTTP port (0 disables) and optional
+# per-request trace spans appended as JSON lines to TRACE_FILE
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9104))
+TRACE_FILE = os.environ.get('TRACE_FILE', '')
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def parse_size(value: str) -> int:
+    """Parse sizes such as 512M or 2G (as in MAX_MEMORY) into bytes"""
+    value = str(value).strip().upper().rstrip('B')
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value or 0)
+
+
+def allowed_modules() -> list:
+    return [name.strip() for name in os.environ.get('ALLOWED_MODULES', '').split(',') if name.strip()]
+
+
+def normalize_package(name: str) -> str:
+    """Canonical project name (PEP 503), so 'Scikit_Learn' and 'scikit-learn' match"""
+    return re.sub(r'[-_.]+', '-', name.strip()).lower()
+
+
+def disk_usage(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def preload_modules() -> list:
+    """Modules imported once in the zygote (PRELOAD_MODULES overrides ALLOWED_MODULES)"""
+    if 'PRELOAD_MODULES' in os.environ:
+        names = os.environ['PRELOAD_MODULES'].split(',')
+    else:
+        names = [IMPORT_NAMES.get(name.lower(), name.replace('-', '_')) for name in allowed_modules()]
+    return [name.strip() for name in names if name.strip()]
+
+
+class OutputBuffer:
+    """Retained output of one stream: the first and the last MAX_OUTPUT_BYTES / 2
+    bytes, with a marker in place of whatever was dropped in between"""
+    
+    def __init__(self, limit: int = MAX_OUTPUT_BYTES):
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.dropped = 0
+    
+    def write(self, data: bytes):
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data:
+            return
+        self.tail += data
+        excess = len(self.tail) - self.tail_limit
+        if excess > 0:
+            del self.tail[:excess]
+            self.dropped += excess
+    
+    def getvalue(self) -> str:
+        if not self.dropped:
+            return (self.head + self.tail).decode('utf-8', errors='replace')
+        marker = f"\n... [{self.dropped} bytes truncated] ...\n"
+        return self.head.decode('utf-8', errors='replace') + marker + self.tail.decode('utf-8', errors='replace')
+
+
+def setup_cgroup():
+    """Prepare per-execution cgroups (v2): the processes of this cgroup move into
+    a `server` leaf so that it can enable the memory and pids controllers for
+    `exec-*` children. Returns the cgroup directory, or None when cgroup v2 is
+    not available or not writable (rlimits still apply)."""
+    try:
+        with open('/proc/self/cgroup') as f:
+            relative = next(line[3:].strip() for line in f if line.startswith('0::'))
+        if os.path.basename(relative) == 'server':
+            relative = os.path.dirname(relative)
+        root = os.path.join('/sys/fs/cgroup', relative.lstrip('/'))
+        with open(os.path.join(root, 'cgroup.controllers')) as f:
+            if not {'memory', 'pids'} <= set(f.read().split()):
+                return None
+        leaf = os.path.join(root, 'server')
+        os.makedirs(leaf, exist_ok=True)
+        with open(os.path.join(root, 'cgroup.procs')) as f:
+            pids = f.read().split()
+        for pid in pids:
+            try:
+                with open(os.path.join(leaf, 'cgroup.procs'), 'w') as f:
+                    f.write(pid)
+            except ProcessLookupError:
+                pass
+        with open(os.path.join(root, 'cgroup.subtree_control'), 'w') as f:
+            f.write('+memory +pids')
+        return root
+    except (OSError, StopIteration) as e:
+        logger.info(f"cgroup v2 limits unavailable ({e}), using rlimits only")
+        return None
+
+
+_limits = None
+
+
+def get_limits() -> dict:
+    """Limits sent with every execution (sets up the cgroup parent on first use)"""
+    global _limits
+    if _limits is None:
+        _limits = {
+            "memory": parse_size(MAX_MEMORY),
+            "cpu_seconds": MAX_CPU_SECONDS,
+            "open_files": MAX_OPEN_FILES,
+            "processes": MAX_PROCESSES,
+            "cgroup": setup_cgroup() if CGROUP_LIMITS else None,
+        }
+    return _limits
+
+
+def create_cgroup(limits: dict):
+    """cgroup for one execution with memory.max and pids.max set, or None"""
+    if not limits or not limits.get("cgroup"):
+        return None
+    path = os.path.join(limits["cgroup"], f"exec-{uuid.uuid4().hex[:12]}")
+    settings = {}
+    if limits["memory"]:
+        settings.update({'memory.max': limits["memory"], 'memory.swap.max': 0})
+    if limits["processes"]:
+        settings['pids.max'] = limits["processes"]
+    try:
+        os.mkdir(path)
+        for name, value in settings.items():
+            # memory.swap.max is missing without swap accounting
+            if os.path.exists(os.path.join(path, name)):
+                with open(os.path.join(path, name), 'w') as f:
+                    f.write(str(value))
+    except OSError as e:
+        logger.warning(f"Cannot create cgroup {path}: {e}")
+        remove_cgroup(path)
+        return None
+    return path
+
+
+def read_cgroup(path: str) -> dict:
+    """Peak memory and limit events of an execution cgroup"""
+    usage = {}
+    try:
+        with open(os.path.join(path, 'memory.peak')) as f:
+            usage["peak_memory"] = int(f.read())
+    except (OSError, ValueError):
+        pass
+    for name, key, field in (('memory.events', 'oom_kills', 'oom_kill'), ('pids.events', 'pids_max', 'max')):
+        try:
+            with open(os.path.join(path, name)) as f:
+                events = dict(line.split() for line in f if line.strip())
+            usage[key] = int(events.get(field, 0))
+        except (OSError, ValueError):
+            pass
+    return usage
+
+
+def remove_cgroup(path: str):
+    """Kill whatever the execution left running in its cgroup and remove it"""
+    if not os.path.isdir(path):
+        return
+    try:
+        with open(os.path.join(path, 'cgroup.kill'), 'w') as f:
+            f.write('1')
+    except OSError:
+        pass
+    for _ in range(50):
+        try:
+            os.rmdir(path)
+            return
+        except OSError:
+            time.sleep(0.01)
+    logger.warning(f"Cannot remove cgroup {path}")
+
+
+def detect_limit(returncode: int, cpu_time: float, stderr: str, cgroup_usage: dict, limits: dict):
+    """Which limit ended or broke a run (None when no limit was hit)"""
+    if cgroup_usage.get("oom_kills"):
+        return "memory"
+    if returncode == -signal.SIGXCPU or (returncode == -signal.SIGKILL and limits.get("cpu_seconds")
+                                        and cpu_time >= limits["cpu_seconds"]):
+        return "cpu_seconds"
+    if cgroup_usage.get("pids_max"):
+        return "processes"
+    last_line = stderr.rstrip().rsplit('\n', 1)[-1]
+    if last_line.startswith('MemoryError'):
+        return "memory"
+    if '[Errno 24]' in last_line:
+        return "open_files"
+    if '[Errno 11]' in last_line and 'fork' in stderr:
+        return "processes"
+    return None
+
+
+def run_forked(envelope: dict, timeout: float, emit=None) -> dict:
+    """Run the envelope's code in a child forked from this (warm) process, like
+    `python script.py`. Output is read from pipes as it is produced and passed
+    to `emit(stream, text)`."""
+    global _current_child
+    limits = envelope.get('limits') or {}
+    cgroup = create_cgroup(limits)
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        returncode = 1
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            if cgroup is not None:
+                enter_cgroup(cgroup)
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(stdout_w, 1)
+            os.dup2(stderr_w, 2)
+            for fd in (stdout_r, stdout_w, stderr_r, stderr_w):
+                os.close(fd)
+            sys.stdout = io.TextIOWrapper(io.FileIO(1, 'w', closefd=False), line_buffering=True)
+            sys.stderr = io.TextIOWrapper(io.FileIO(2, 'w', closefd=False), line_buffering=True)
+            apply_envelope(envelope)
+            namespace = script_namespace(envelope)
+            apply_rlimits(limits)
+            returncode = exec_code(envelope['code'], namespace)
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(returncode)
+    
+    spawned = time.monotonic()
+    _current_child = pid
+    os.close(stdout_w)
+    os.close(stderr_w)
+    try:
+        status, rusage, timed_out, buffers = collect_output(
+            pid, {stdout_r: "stdout", stderr_r: "stderr"}, timeout, emit
+        )
+        exited = time.monotonic()
+    finally:
+        _current_child = None
+        os.close(stdout_r)
+        os.close(stderr_r)
+        cgroup_usage = {}
+        if cgroup is not None:
+            cgroup_usage = read_cgroup(cgroup)
+            remove_cgroup(cgroup)
+    
+    result = {
+        "stdout": buffers["stdout"].getvalue(),
+        "stderr": buffers["stderr"].getvalue(),
+        "returncode": os.waitstatus_to_exitcode(status),
+        "timed_out": timed_out,
+    }
+    result["usage"] = execution_usage(
+        result, exited - started, rusage.ru_utime, rusage.ru_stime,
+        rusage.ru_maxrss * 1024, cgroup_usage, limits
+    )
+    # Absolute monotonic times, shared by all processes on the host
+    result["phases"] = {"spawn": (started, spawned), "execution": (spawned, exited),
+                        "encoding": (exited, time.monotonic())}
+    return result
+
+
+def execution_usage(result: dict, wall_time: float, user_time, system_time, peak_rss,
+                    cgroup_usage: dict, limits: dict) -> dict:
+    """Resource accounting reported with each result"""
+    limit_hit = "timeout" if result.get("timed_out") else detect_limit(
+        result["returncode"], (user_time or 0) + (system_time or 0), result["stderr"], cgroup_usage, limits
+    )
+    return {
+        "wall_time": round(wall_time, 6),
+        "user_time": round(user_time, 6) if user_time is not None else None,
+        "system_time": round(system_time, 6) if system_time is not None else None,
+        # The cgroup peak also covers processes the code started
+        "peak_rss": cgroup_usage.get("peak_memory", peak_rss),
+        "limit_hit": limit_hit,
+    }
+
+
+def collect_output(pid: int, pipes: dict, timeout: float, emit=None) -> tuple:
+    """Read a child's output pipes until it exits or times out (then it is killed).
+    Returns (wait status, rusage, timed out, {stream: OutputBuffer})."""
+    buffers = {name: OutputBuffer() for name in pipes.values()}
+    decoders = {name: codecs.getincrementaldecoder('utf-8')(errors='replace') for name in pipes.values()}
+    open_fds = set(pipes)
+    
+    def read_chunk(fd):
+        data = os.read(fd, OUTPUT_CHUNK)
+        if not data:
+            open_fds.discard(fd)
+            return
+        name = pipes[fd]
+        buffers[name].write(data)
+        if emit is not None:
+            text = decoders[name].decode(data)
+            if text:
+                emit(name, text)
+    
+    pidfd = os.pidfd_open(pid) if hasattr(os, 'pidfd_open') else None
+    deadline = time.monotonic() + timeout
+    status = None
+    timed_out = False
+    try:
+        while status is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                os.kill(pid, signal.SIGKILL)
+                _, status, rusage = os.wait4(pid, 0)
+                timed_out = True
+                break
+            waitables = list(open_fds) + ([pidfd] if pidfd is not None else [])
+            ready, _, _ = select.select(waitables, [], [], remaining if pidfd is not None else min(remaining, 0.005))
+            for fd in ready:
+                if fd != pidfd:
+                    read_chunk(fd)
+            if pidfd is None or pidfd in ready:
+                done, exit_status, exit_rusage = os.wait4(pid, os.WNOHANG)
+                if done:
+                    status, rusage = exit_status, exit_rusage
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+    
+    # Whatever is left in the pipes; processes the child left behind may keep
+    # them open, so do not wait for EOF for long
+    drain_deadline = time.monotonic() + 0.1
+    while open_fds:
+        ready, _, _ = select.select(list(open_fds), [], [], max(0, drain_deadline - time.monotonic()))
+        if not ready:
+            break
+        for fd in ready:
+            read_chunk(fd)
+    return status, rusage, timed_out, buffers
+
+
+_current_child = None
+
+
+def _terminate_worker(signum, frame):
+    # Cancellation: the server terminates the worker, which takes its child along
+    if _current_child is not None:
+        try:
+            os.kill(_current_child, signal.SIGKILL)
+            # Reap it here; an orphan would end up as a zombie under PID 1
+            os.waitpid(_current_child, 0)
+        except OSError:
+            pass
+    os._exit(1)
+
+
+def warm_imports():
+    """Import the preloaded modules (no-op when the zygote already did)"""
+    for name in preload_modules():
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.warning(f"Cannot preload {name}: {e}")
+
+
+def _worker_main(conn):
+    """Warm worker: modules are already imported by the zygote, each job runs in a fresh fork"""
+    signal.signal(signal.SIGTERM, _terminate_worker)
+    warm_imports()
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        emit = None
+        if job.get('stream'):
+            emit = lambda stream, data: conn.send({"stream": stream, "data": data})
+        conn.send({"result": run_forked(job['envelope'], job['timeout'], emit)})
+
+
+_context = None
+
+
+def zygote_context():
+    """multiprocessing context whose forkserver (the zygote) has the allowed modules imported"""
+    global _context
+    if _context is None:
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            _context = multiprocessing.get_context('forkserver')
+            # '__main__' lets the zygote import this module once instead of per process
+            _context.set_forkserver_preload(['__main__'] + preload_modules())
+        else:
+            _context = multiprocessing.get_context('spawn')
+    return _context
+
+
+def start_process(target) -> dict:
+    """Start a worker or session process from the zygote, connected by a pipe"""
+    context = zygote_context()
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=target, args=(child_conn,), daemon=True)
+    process.start()
+    child_conn.close()
+    return {"process": process, "conn": parent_conn, "runs": 0}
+
+
+def stop_process(entry: dict, graceful: bool = True):
+    """Ask a worker or session process to exit (or terminate it) and wait for it"""
+    try:
+        if graceful:
+            entry["conn"].send(None)
+        else:
+            entry["process"].terminate()
+    except OSError:
+        pass
+    entry["conn"].close()
+    entry["process"].join(timeout=1)
+    if entry["process"].is_alive():
+        entry["process"].kill()
+        entry["process"].join()
+
+
+def start_session(target, kernel_processes: int = 0) -> dict:
+    """Start a session process in its own cgroup (when available), so that the
+    memory and process limits of an execution cover the whole session, plus
+    `kernel_processes` the kernel itself keeps (notebook checkpoints)"""
+    session = start_process(target)
+    limits = get_limits()
+    if limits["processes"] and kernel_processes:
+        limits = {**limits, "processes": limits["processes"] + kernel_processes}
+    session["cgroup"] = create_cgroup(limits)
+    if session["cgroup"] is not None:
+        enter_cgroup(session["cgroup"], session["process"].pid)
+    return session
+
+
+def stop_session(session: dict, graceful: bool = True):
+    stop_process(session, graceful)
+    if session["cgroup"] is not None:
+        remove_cgroup(session["cgroup"])
+
+
+async def receive(conn, timeout: float):
+    """Wait for a message from a worker or session without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    loop.add_reader(conn.fileno(), lambda: readable.done() or readable.set_result(None))
+    try:
+        await asyncio.wait_for(readable, timeout)
+    finally:
+        loop.remove_reader(conn.fileno())
+    return conn.recv()
+
+
+def drain_pipes(pipes: dict, buffers: dict, done: threading.Event):
+    """Reader thread of run_in_namespace: pipe output goes into the buffers as
+    it is produced, so a writer blocks on a full pipe instead of growing a file.
+    Once `done` is set, whatever is left is read until EOF or for at most 0.1
+    seconds (processes the code started may keep the pipes open)."""
+    open_fds = set(pipes)
+    drain_deadline = None
+    while open_fds:
+        if drain_deadline is None and done.is_set():
+            drain_deadline = time.monotonic() + 0.1
+        timeout = 0.05 if drain_deadline is None else drain_deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        ready, _, _ = select.select(list(open_fds), [], [], timeout)
+        for fd in ready:
+            data = os.read(fd, OUTPUT_CHUNK)
+            if data:
+                buffers[pipes[fd]].write(data)
+            else:
+                open_fds.discard(fd)
+    for fd in pipes:
+        os.close(fd)
+
+
+def run_in_namespace(code: str, namespace: dict, filename: str = '<session>', limits: dict = None) -> dict:
+    """Run code in this process with fds 1 and 2 redirected to pipes that a
+    reader thread drains into OutputBuffers, so retained output stays bounded
+    while the code runs. Usage covers this call: CPU times and cgroup limit
+    events are deltas, the peak is the session's (memory.peak of its cgroup,
+    else peak RSS)."""
+    limits = limits or {}
+    cgroup = limits.get("cgroup_path")
+    cgroup_before = read_cgroup(cgroup) if cgroup else {}
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.monotonic()
+    buffers = {"stdout": OutputBuffer(), "stderr": OutputBuffer()}
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pipes = {}
+    saved = {}
+    for fd, name in ((1, "stdout"), (2, "stderr")):
+        read_fd, write_fd = os.pipe()
+        pipes[read_fd] = name
+        saved[fd] = os.dup(fd)
+        os.dup2(write_fd, fd)
+        os.close(write_fd)
+    done = threading.Event()
+    reader = threading.Thread(target=drain_pipes, args=(pipes, buffers, done), name='output', daemon=True)
+    reader.start()
+    try:
+        returncode = exec_code(code, namespace, filename)
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            # Closes the last write ends, so the reader sees EOF
+            for fd, copy in saved.items():
+                os.dup2(copy, fd)
+                os.close(copy)
+            done.set()
+            reader.join()
+    wall_time = time.monotonic() - started
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    
+    result = {
+        "stdout": buffers["stdout"].getvalue(),
+        "stderr": buffers["stderr"].getvalue(),
+        "returncode": returncode,
+    }
+    cgroup_usage = read_cgroup(cgroup) if cgroup else {}
+    for key in ("oom_kills", "pids_max"):
+        if key in cgroup_usage:
+            cgroup_usage[key] -= cgroup_before.get(key, 0)
+    result["usage"] = execution_usage(
+        result, wall_time, after.ru_utime - before.ru_utime, after.ru_stime - before.ru_stime,
+        after.ru_maxrss * 1024, cgroup_usage, limits
+    )
+    return result
+
+
+def kernel_setup():
+    """Common start of session and notebook kernels"""
+    warm_imports()
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    sys.stdout = io.TextIOWrapper(io.FileIO(1, 'w', closefd=False), line_buffering=True)
+    sys.stderr = io.TextIOWrapper(io.FileIO(2, 'w', closefd=False), line_buffering=True)
+    sys.argv = ['<session>']
+
+
+def _session_main(conn):
+    """Session kernel: every request runs in the same namespace, so globals persist"""
+    kernel_setup()
+    namespace = {'__name__': '__main__', '__builtins__': __builtins__}
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        limits = job.get('limits') or {}
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        apply_rlimits(limits, cpu_used=usage.ru_utime + usage.ru_stime)
+        conn.send(run_in_namespace(job['code'], namespace, limits=limits))
+
+
+def process_tree(pid: int) -> list:
+    """`pid` and its descendants"""
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return pids
+
+
+def process_memory(pid: int) -> int:
+    """Proportional set size of a process in bytes, so that pages forked
+    processes share are counted once in a sum (RSS where PSS is unavailable)"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def die_with_parent():
+    """Ask the kernel to SIGKILL this process if its parent dies (Linux only)"""
+    try:
+        # PR_SET_PDEATHSIG
+        ctypes.CDLL(None, use_errno=True).prctl(1, signal.SIGKILL)
+    except (OSError, AttributeError):
+        pass
+
+
+def _notebook_main(conn):
+    """Notebook kernel: a session that keeps the state before some cells. A
+    cell at a checkpoint runs in a fork of the kernel and the parent stays
+    behind, blocked on a pipe; other cells run in place. {"restore": n} wakes
+    the nearest checkpoint at or before cell n, exits the kernels below it and
+    replies with that checkpoint's cell, from which the caller runs again.
+    When a kernel exits, the checkpoints above it see EOF and exit in turn."""
+    kernel_setup()
+    top = os.getpid()
+    namespace = {'__name__': '__main__', '__builtins__': __builtins__}
+    # (cell, write end of the pipe its checkpoint waits on), oldest first
+    checkpoints = []
+    cells = 0
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        if 'restore' in job:
+            _, resume_w = [checkpoint for checkpoint in checkpoints if checkpoint[0] <= job['restore']][-1]
+            os.write(resume_w, b'r')
+            os._exit(0)
+        
+        limits = dict(job.get('limits') or {})
+        if limits.get('processes'):
+            # The checkpoints are the kernel's, not the cell's
+            limits['processes'] += NOTEBOOK_CHECKPOINTS + 1
+        if cells % NOTEBOOK_CHECKPOINT_EVERY == 0 and len(checkpoints) < NOTEBOOK_CHECKPOINTS:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            resume_r, resume_w = os.pipe()
+            try:
+                pid = os.fork()
+            except OSError as e:
+                os.close(resume_r)
+                os.close(resume_w)
+                result = {"stdout": "", "stderr": f"{type(e).__name__}: cannot checkpoint the kernel: {e}\n",
+                          "returncode": 1}
+                result["usage"] = execution_usage(result, 0, 0, 0, None, {}, limits)
+                conn.send(result)
+                continue
+            if pid == 0:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                die_with_parent()
+                os.close(resume_r)
+                checkpoints.append((cells, resume_w))
+                conn.send({"kernel_pid": os.getpid()})
+            else:
+                # Checkpoint: wait until resumed, or until every kernel below has exited
+                os.close(resume_w)
+                command = os.read(resume_r, 1)
+                os.close(resume_r)
+                _, status = os.waitpid(pid, 0)
+                if not command:
+                    if status:
+                        # The kernel below was killed (e.g. at a limit) instead of exiting
+                        try:
+                            conn.send({"exited": os.waitstatus_to_exitcode(status)})
+                        except OSError:
+                            pass
+                    break
+                conn.send({"kernel_pid": os.getpid()})
+                conn.send({"restored": cells})
+                continue
+        
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        apply_rlimits(limits, cpu_used=usage.ru_utime + usage.ru_stime)
+        conn.send(run_in_namespace(job['code'], namespace, f"<cell {cells}>", limits))
+        cells += 1
+    
+    if os.getpid() != top:
+        os._exit(0)
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class ExecutionQueue:
+    """Admission control: at most `max_concurrency` executions at once, the
+    rest wait in strict arrival order; beyond `max_queue` waiters requests are
+    rejected with QueueFullError instead of piling up"""
+    
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.running = 0
+        self.waiters = deque()
+        self.rejected = 0
+    
+    async def acquire(self):
+        if self.running < self.max_concurrency and not self.waiters:
+            self.running += 1
+            return
+        if len(self.waiters) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"Execution queue is full ({len(self.waiters)} waiting)")
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before cancellation
+                self.release()
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            raise
+    
+    def release(self):
+        # Hand the slot straight to the oldest waiter so newcomers cannot overtake it
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.running -= 1
+    
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": len(self.waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+
+class WorkerPool:
+    """Pre-forked warm workers started from a forkserver (zygote) that has the
+    allowed modules imported; each worker is replaced after `max_runs` jobs"""
+    
+    def __init__(self, size: int = WORKER_POOL_SIZE, max_runs: int = WORKER_MAX_RUNS):
+        self.size = size
+        self.max_runs = max_runs
+        self.idle = asyncio.Queue()
+        for _ in range(size):
+            self.idle.put_nowait(start_process(_worker_main))
+    
+    async def replace(self, worker: dict, graceful: bool = True):
+        """Retire a worker and put a fresh one in the pool without blocking the loop"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, stop_process, worker, graceful)
+        self.idle.put_nowait(await loop.run_in_executor(None, start_process, _worker_main))
+    
+    async def execute(self, envelope: dict, timeout: float, on_output=None) -> dict:
+        waiting = time.monotonic()
+        worker = await self.idle.get()
+        acquired = time.monotonic()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout + WORKER_GRACE
+        try:
+            worker["conn"].send({"envelope": envelope, "timeout": timeout, "stream": on_output is not None})
+            while True:
+                message = await receive(worker["conn"], max(0, deadline - loop.time()))
+                if "result" in message:
+                    result = message["result"]
+                    break
+                await on_output(message["stream"], message["data"])
+        except BaseException:
+            # Cancelled, hung or dead worker: terminating it kills the running
+            # child too; a replacement is started in the background
+            asyncio.ensure_future(self.replace(worker, graceful=False))
+            raise
+        
+        result.setdefault("phases", {})["worker_wait"] = (waiting, acquired)
+        worker["runs"] += 1
+        if worker["runs"] >= self.max_runs:
+            asyncio.ensure_future(self.replace(worker))
+        else:
+            self.idle.put_nowait(worker)
+        return result
+    
+    def close(self):
+        while not self.idle.empty():
+            stop_process(self.idle.get_nowait())
+
+
+class SessionManager:
+    """Long-lived session processes that keep their globals between calls,
+    each in its own cgroup when available. Sessions idle for longer than
+    `idle_timeout` are closed; opening more than `max_sessions` or exceeding
+    `memory_limit` (combined memory) evicts the least recently used idle
+    sessions."""
+    
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 memory_limit: int = parse_size(SESSION_MEMORY_LIMIT)):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.memory_limit = memory_limit
+        # Least recently used first
+        self.sessions = OrderedDict()
+        self.evicted = 0
+        self.reaper = None
+    
+    def get(self, session_id: str) -> dict:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise ValueError(f"Unknown session: {session_id}")
+        return session
+    
+    async def open(self, target=_session_main, kernel_processes: int = 0) -> dict:
+        if len(self.sessions) >= self.max_sessions and not self.evict_lru('session limit'):
+            raise RuntimeError(f"All {self.max_sessions} sessions are busy")
+        
+        loop = asyncio.get_running_loop()
+        session = await loop.run_in_executor(None, start_session, target, kernel_processes)
+        session.update(id=uuid.uuid4().hex, lock=asyncio.Lock(), last_used=time.monotonic())
+        self.sessions[session["id"]] = session
+        if self.reaper is None or self.reaper.done():
+            self.reaper = asyncio.ensure_future(self.reap())
+        return session
+    
+    async def execute(self, session_id: str, code: str, timeout: float, name: str = 'execute_in_session') -> dict:
+        limits = {**get_limits(), "cgroup_path": self.get(session_id)["cgroup"]}
+        result = await self.request(session_id, {"code": code, "limits": limits}, timeout, name)
+        result["memory"] = self.rss(self.sessions.get(session_id) or {})
+        self.enforce_memory_limit()
+        return result
+    
+    async def request(self, session_id: str, message: dict, timeout: float, name: str = 'execute_in_session') -> dict:
+        """Send one request to a session's kernel and wait for its reply"""
+        session = self.get(session_id)
+        async with session["lock"]:
+            if session_id not in self.sessions:
+                raise ValueError(f"Session was closed: {session_id}")
+            self.sessions.move_to_end(session_id)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            deadline = started + timeout
+            try:
+                session["conn"].send(message)
+                while True:
+                    reply = await receive(session["conn"], max(0, deadline - loop.time()))
+                    # Notebook kernels announce which process runs the request
+                    if "kernel_pid" not in reply:
+                        break
+                    session["kernel_pid"] = reply["kernel_pid"]
+            except asyncio.TimeoutError:
+                # The session's state cannot be trusted after an interrupted run
+                self.discard(session_id, graceful=False)
+                raise subprocess.TimeoutExpired(name, timeout)
+            except EOFError:
+                reply = {"exited": None}
+            except BaseException:
+                self.discard(session_id, graceful=False)
+                raise
+            if "exited" in reply:
+                # The kernel died, e.g. at its CPU limit or by the cgroup OOM killer
+                return await self.ended(session, loop.time() - started, message.get("limits") or {}, reply["exited"])
+            session["runs"] += 1
+            session["last_used"] = time.monotonic()
+        return reply
+    
+    async def ended(self, session: dict, wall_time: float, limits: dict, returncode: int = None) -> dict:
+        """Result of a request whose kernel died (with `returncode` when a
+        notebook checkpoint reported it); the session is closed"""
+        cgroup_usage = read_cgroup(session["cgroup"]) if session["cgroup"] is not None else {}
+        stopping = self.discard(session["id"], graceful=False)
+        if stopping is not None:
+            await stopping
+        if returncode is None:
+            returncode = session["process"].exitcode
+        result = {
+            "stdout": "",
+            "stderr": f"SessionClosed: the kernel exited with code {returncode}\n",
+            "returncode": returncode,
+        }
+        result["usage"] = execution_usage(result, wall_time, None, None, None, cgroup_usage, limits)
+        return result
+    
+    def discard(self, session_id: str, graceful: bool = True):
+        """Forget a session and stop its process in the background (awaitable)"""
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return None
+        if session.get("kernel_pid"):
+            # Killing the running notebook kernel lets its checkpoints exit
+            # one by one; terminating the top process would orphan them
+            try:
+                os.kill(session["kernel_pid"], signal.SIGKILL)
+            except OSError:
+                pass
+            graceful = True
+        return asyncio.get_running_loop().run_in_executor(None, stop_session, session, graceful)
+    
+    def close(self, session_id: str):
+        session = self.get(session_id)
+        self.discard(session_id, graceful=not session["lock"].locked())
+    
+    def evict(self, session_id: str, reason: str):
+        logger.info(f"Evicting session {session_id} ({reason})")
+        self.evicted += 1
+        self.discard(session_id)
+    
+    def evict_lru(self, reason: str) -> bool:
+        for session_id, session in self.sessions.items():
+            if not session["lock"].locked():
+                self.evict(session_id, reason)
+                return True
+        return False
+    
+    def rss(self, session: dict) -> int:
+        """Memory of a session in bytes: usage of its cgroup, else the memory of
+        its processes (with a notebook's checkpoints; 0 when unknown)"""
+        if session.get("cgroup") is not None:
+            try:
+                with open(os.path.join(session["cgroup"], 'memory.current')) as f:
+                    return int(f.read())
+            except (OSError, ValueError):
+                pass
+        if "process" not in session:
+            return 0
+        return sum(process_memory(pid) for pid in process_tree(session["process"].pid))
+    
+    def enforce_memory_limit(self):
+        if self.memory_limit <= 0:
+            return
+        usage = {session_id: self.rss(session) for session_id, session in self.sessions.items()}
+        total = sum(usage.values())
+        for session_id in list(self.sessions):
+            if total <= self.memory_limit:
+                break
+            if not self.sessions[session_id]["lock"].locked():
+                total -= usage[session_id]
+                self.evict(session_id, 'memory limit')
+    
+    async def reap(self):
+        """Close idle sessions; runs while any session is open"""
+        while self.sessions:
+            await asyncio.sleep(min(self.idle_timeout / 4, 30))
+            now = time.monotonic()
+            for session_id, session in list(self.sessions.items()):
+                if not session["lock"].locked() and now - session["last_used"] > self.idle_timeout:
+                    self.evict(session_id, 'idle')
+    
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "open": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "evicted": self.evicted,
+            "sessions": [
+                {
+                    "session_id": session_id,
+                    "runs": session["runs"],
+                    "idle": round(now - session["last_used"], 1),
+                    "busy": session["lock"].locked(),
+                    "memory": self.rss(session),
+                }
+                for session_id, session in self.sessions.items()
+            ],
+        }
+
+
+class PackageInstallError(RuntimeError):
+    pass
+
+
+class EnvironmentCache:
+    """Package environments for pip_install, keyed by the normalized package set.
+    Each one is a directory built once with `pip install --target` and put in
+    front of sys.path of the executions that ask for it; concurrent requests
+    for the same set share one build. Unused environments are evicted least
+    recently used first while the cache is larger than `max_bytes`. A failed
+    build raises PackageInstallError, and so does every request for the same
+    set within `failure_ttl` seconds."""
+    
+    def __init__(self, root: str = ENV_CACHE_DIR, max_bytes: int = parse_size(ENV_CACHE_SIZE),
+                 wheelhouse: str = WHEELHOUSE, failure_ttl: float = ENV_FAILURE_TTL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.wheelhouse = wheelhouse
+        self.failure_ttl = failure_ttl
+        # key -> (expiry, message) of recently failed builds
+        self.failures = {}
+        # Least recently used first
+        self.entries = OrderedDict()
+        self.builds = {}
+        self.installed = {}
+        self.loaded = False
+        self.hits = 0
+        self.evicted = 0
+    
+    def load(self):
+        """Pick up environments left by a previous run, oldest first"""
+        os.makedirs(self.root, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.root):
+            if not entry.is_dir():
+                continue
+            if entry.name.startswith('.'):
+                # Interrupted build
+                shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            if not re.fullmatch('[0-9a-f]{16}', entry.name):
+                # Not an environment (see key()); never counted or evicted
+                continue
+            found.append((entry.stat().st_mtime, entry.name, entry.path))
+        for _, key, path in sorted(found):
+            self.entries[key] = {"key": key, "path": path, "size": disk_usage(path), "users": 0}
+        self.loaded = True
+    
+    def is_installed(self, package: str) -> bool:
+        """Whether the server interpreter (and so every worker) already has the package"""
+        if package not in self.installed:
+            try:
+                importlib.metadata.distribution(package)
+                self.installed[package] = True
+            except importlib.metadata.PackageNotFoundError:
+                self.installed[package] = False
+        return self.installed[package]
+    
+    def key(self, packages: list) -> str:
+        # Interpreter version is part of the key: compiled wheels are not portable
+        spec = '\n'.join([sys.version] + packages)
+        return hashlib.sha256(spec.encode('utf-8')).hexdigest()[:16]
+    
+    async def acquire(self, packages: list):
+        """Environment with `packages`, built on first use; None when nothing is
+        missing from the base interpreter. Pair with release()."""
+        if not self.loaded:
+            await asyncio.get_running_loop().run_in_executor(None, self.load)
+        
+        missing = sorted({normalize_package(package) for package in packages} - {''})
+        missing = [package for package in missing if not self.is_installed(package)]
+        if not missing:
+            return None
+        
+        key = self.key(missing)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+        else:
+            expiry, message = self.failures.get(key, (0, None))
+            if time.monotonic() < expiry:
+                raise PackageInstallError(message)
+            build = self.builds.get(key)
+            if build is None:
+                build = self.builds[key] = asyncio.ensure_future(self.build(key, missing))
+                build.add_done_callback(lambda _: self.builds.pop(key, None))
+            # A cancelled request must not cancel a build others are waiting for
+            entry = await asyncio.shield(build)
+        
+        self.entries.move_to_end(key)
+        entry["users"] += 1
+        try:
+            os.utime(entry["path"])
+        except OSError:
+            pass
+        return entry
+    
+    def release(self, entry):
+        if entry is not None:
+            entry["users"] -= 1
+            self.evict()
+    
+    async def build(self, key: str, packages: list):
+        staging = tempfile.mkdtemp(prefix=f'.{key}-', dir=self.root)
+        command = [sys.executable, '-m', 'pip', 'install', '--target', staging,
+                   '--disable-pip-version-check', '--no-input']
+        if self.wheelhouse:
+            command += ['--no-index', '--find-links', self.wheelhouse]
+        command += packages
+        
+        started = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
         )
+        output, _ = await process.communicate()
+        loop = asyncio.get_running_loop()
+        if process.returncode != 0:
+            message = f"pip install {' '.join(packages)} failed: {output.decode(errors='replace')[-500:]}"
+            logger.warning(message)
+            await loop.run_in_executor(None, shutil.rmtree, staging, True)
+            self.failures = {failed: failure for failed, failure in self.failures.items()
+                             if failure[0] > time.monotonic()}
+            self.failures[key] = (time.monotonic() + self.failure_ttl, message)
+            raise PackageInstallError(message)
+        
+        path = os.path.join(self.root, key)
+        os.rename(staging, path)
+        entry = {"key": key, "path": path, "size": await loop.run_in_executor(None, disk_usage, path), "users": 0}
+        self.entries[key] = entry
+        logger.info(f"Built environment {key} ({' '.join(packages)}) in {time.monotonic() - started:.1f}s")
+        self.evict()
+        return entry
+    
+    def evict(self):
+        total = sum(entry["size"] for entry in self.entries.values())
+        for key in list(self.entries):
+            if total <= self.max_bytes:
+                break
+            entry = self.entries[key]
+            if entry["users"] == 0:
+                del self.entries[key]
+                total -= entry["size"]
+                self.evicted += 1
+                asyncio.get_running_loop().run_in_executor(None, shutil.rmtree, entry["path"], True)
+    
+    def stats(self) -> dict:
+        return {
+            "environments": len(self.entries),
+            "building": len(self.builds),
+            "failed": sum(1 for expiry, _ in self.failures.values() if expiry > time.monotonic()),
+            "bytes": sum(entry["size"] for entry in self.entries.values()),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "evicted": self.evicted,
+        }
+
+
+class ResultCache:
+    """Memoized execute_python results keyed by code, package set, interpreter
+    version and the digests of declared input files. Hits are served from
+    memory; the disk store (one JSON file per key) survives restarts. Both
+    stores drop expired entries and evict least recently used ones beyond
+    their size limit."""
+    
+    def __init__(self, root: str = RESULT_CACHE_DIR, ttl: float = RESULT_CACHE_TTL,
+                 max_memory: int = parse_size(RESULT_CACHE_MEMORY), max_bytes: int = parse_size(RESULT_CACHE_SIZE)):
+        self.root = root
+        self.ttl = ttl
+        self.max_memory = max_memory
+        self.max_bytes = max_bytes
+        # Least recently used first: key -> entry / key -> file size
+        self.memory = OrderedDict()
+        self.disk = OrderedDict()
+        self.digests = {}
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+    
+    def load(self):
+        os.makedirs(self.root, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        for _, key, size in sorted(found):
+            self.disk[key] = size
+        self.loaded = True
+    
+    def file_digest(self, path: str) -> str:
+        """Content digest of an input file, recomputed only when the file changes"""
+        stat = os.stat(path)
+        signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        cached = self.digests.get(path)
+        if cached is None or cached[0] != signature:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            cached = self.digests[path] = (signature, digest.hexdigest())
+        return cached[1]
+    
+    def stale_inputs(self, paths: list) -> bool:
+        """Whether any input file has to be (re)hashed"""
+        for path in paths:
+            cached = self.digests.get(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return True
+            if cached is None or cached[0] != (stat.st_ino, stat.st_size, stat.st_mtime_ns):
+                return True
+        return False
+    
+    def key(self, code: str, packages: list, inputs: list, args: list = None, env: dict = None) -> str:
+        spec = {
+            "code": code,
+            "args": args or [],
+            "env": env or {},
+            "packages": sorted({normalize_package(package) for package in packages}),
+            "python": sys.version,
+            "inputs": {path: self.file_digest(path) for path in sorted(set(inputs))},
+        }
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+    
+    async def get(self, key: str):
+        """Cached result for `key` with its artifacts restored, or None"""
+        entry = self.memory.get(key)
+        if entry is not None:
+            self.memory.move_to_end(key)
+        else:
+            entry = await asyncio.get_running_loop().run_in_executor(None, self.read, key)
+            if entry is not None:
+                self.remember(key, entry)
+        
+        if entry is None or entry["expires"] < time.time():
+            if entry is not None:
+                self.forget(key)
+            self.misses += 1
+            return None
+        
+        if entry["artifacts"]:
+            in_use = await _run_outputs.acquire([entry["result"].get("output_dir")])
+            try:
+                restored = await asyncio.get_running_loop().run_in_executor(
+                    None, self.restore, entry["result"].get("output_dir"), entry["artifacts"]
+                )
+            finally:
+                _run_outputs.release(in_use)
+            if not restored:
+                self.forget(key)
+                self.misses += 1
+                return None
+        self.hits += 1
+        return {**entry["result"], "cached": True}
+    
+    async def put(self, key: str, result: dict, artifacts: dict):
+        entry = {
+            "result": {name: result[name] for name in ("stdout", "stderr", "returncode", "data_outputs", "output_dir")
+                       if name in result},
+            "artifacts": artifacts,
+            "expires": time.time() + self.ttl,
+        }
+        entry["size"] = sum(len(value) for value in entry["result"].values() if isinstance(value, str)) \
+            + sum(len(data) for data in artifacts.values())
+        if entry["size"] > self.max_bytes:
+            return
+        self.remember(key, entry)
+        await asyncio.get_running_loop().run_in_executor(None, self.write, key, entry)
+    
+    def remember(self, key: str, entry: dict):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        total = sum(item["size"] for item in self.memory.values())
+        while total > self.max_memory and len(self.memory) > 1:
+            _, evicted = self.memory.popitem(last=False)
+            total -= evicted["size"]
+    
+    def forget(self, key: str):
+        self.memory.pop(key, None)
+        if self.disk.pop(key, None) is not None:
+            try:
+                os.unlink(self.path(key))
+            except OSError:
+                pass
+    
+    def read(self, key: str):
+        if not self.loaded:
+            self.load()
+        if key not in self.disk:
+            return None
+        try:
+            with open(self.path(key), 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            os.utime(self.path(key))
+        except (OSError, ValueError):
+            self.disk.pop(key, None)
+            return None
+        self.disk.move_to_end(key)
+        stored["artifacts"] = {name: base64.b64decode(data) for name, data in stored["artifacts"].items()}
+        return stored
+    
+    def write(self, key: str, entry: dict):
+        if not self.loaded:
+            self.load()
+        stored = {**entry, "artifacts": {name: base64.b64encode(data).decode('ascii')
+                                         for name, data in entry["artifacts"].items()}}
+        # The directory may have been removed since load()
+        os.makedirs(self.root, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(stored, f)
+        os.replace(temp_path, self.path(key))
+        self.disk[key] = os.path.getsize(self.path(key))
+        self.disk.move_to_end(key)
         
+        total = sum(self.disk.values())
+        for old_key in list(self.disk):
+            if total <= self.max_bytes:
+                break
+            if old_key != key:
+                total -= self.disk.pop(old_key)
+                try:
+                    os.unlink(self.path(old_key))
+                except OSError:
+                    pass
+    
+    def restore(self, output_dir: str, artifacts: dict) -> bool:
+        """Write back the artifacts missing from the run's directory. Files that
+        were changed since are left alone and the entry is not used (False)."""
+        if not output_dir:
+            return False
+        for name, data in artifacts.items():
+            path = os.path.join(output_dir, name)
+            try:
+                if os.path.getsize(path) != len(data):
+                    return False
+                with open(path, 'rb') as f:
+                    if f.read() != data:
+                        return False
+                continue
+            except FileNotFoundError:
+                pass
+            except OSError:
+                return False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        return True
+    
+    def stats(self) -> dict:
         return {
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "returncode": result.returncode
+            "memory_entries": len(self.memory),
+            "memory_bytes": sum(entry["size"] for entry in self.memory.values()),
+            "disk_entries": len(self.disk),
+            "disk_bytes": sum(self.disk.values()),
+            "hits": self.hits,
+            "misses": self.misses,
         }
+
+
+def collect_artifacts(output_dir: str) -> dict:
+    """relative path -> contents of the files a cached run left in its directory"""
+    artifacts = {}
+    for directory, _, names in os.walk(output_dir):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                with open(path, 'rb') as f:
+                    artifacts[os.path.relpath(path, output_dir)] = f.read()
+            except OSError:
+                pass
+    return artifacts
+
+
+class RunOutputs:
+    """Retention of the per-run directories under OUTPUT_DIR. A directory is in
+    use while a run writes to it or reads a data input from it; unused ones
+    expire `ttl` seconds after their last use and are evicted least recently
+    used first beyond `max_bytes`."""
+    
+    def __init__(self, roots: tuple = (os.path.join(OUTPUT_DIR, 'data'), os.path.join(OUTPUT_DIR, 'runs')),
+                 ttl: float = RUN_OUTPUT_TTL, max_bytes: int = parse_size(RUN_OUTPUT_SIZE)):
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        # Least recently used first
+        self.entries = OrderedDict()
+        self.loaded = False
+        self.removed = 0
+    
+    def load(self):
+        """Pick up directories left by a previous run, oldest first"""
+        found = []
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            for entry in os.scandir(root):
+                if entry.is_dir(follow_symlinks=False):
+                    found.append((entry.stat().st_mtime, entry.path))
+        for used, path in sorted(found):
+            self.entries[path] = {"path": path, "size": disk_usage(path), "used": used, "users": 0}
+        self.loaded = True
+    
+    def directory(self, path: str):
+        """The run directory holding `path`, or None outside of the roots"""
+        path = os.path.realpath(path)
+        for root in self.roots:
+            if path != root and os.path.commonpath([path, root]) == root:
+                return os.path.join(root, os.path.relpath(path, root).split(os.sep)[0])
+        return None
+    
+    async def acquire(self, paths: list) -> list:
+        """Mark the directories of `paths` as in use (registering new ones). Pair with release()."""
+        if not self.loaded:
+            await asyncio.get_running_loop().run_in_executor(None, self.load)
+        entries = []
+        for path in paths:
+            directory = self.directory(path) if path else None
+            if directory is None:
+                continue
+            entry = self.entries.setdefault(directory, {"path": directory, "size": 0, "users": 0})
+            entry["users"] += 1
+            entry["used"] = time.time()
+            self.entries.move_to_end(directory)
+            entries.append(entry)
+        return entries
+    
+    def release(self, entries: list):
+        for entry in entries:
+            entry["users"] -= 1
+            entry["used"] = time.time()
+        if entries:
+            asyncio.ensure_future(self.update(entries))
+    
+    async def update(self, entries: list):
+        """Re-measure directories after use, then enforce the limits"""
+        sizes = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: [disk_usage(entry["path"]) if os.path.isdir(entry["path"]) else None for entry in entries]
+        )
+        for entry, size in zip(entries, sizes):
+            if size is None and not entry["users"]:
+                # Never created (the run wrote no data outputs)
+                self.entries.pop(entry["path"], None)
+            else:
+                entry["size"] = size or 0
+        self.prune()
+    
+    def prune(self):
+        now = time.time()
+        total = sum(entry["size"] for entry in self.entries.values())
+        for path in list(self.entries):
+            entry = self.entries[path]
+            if entry["users"] or (now - entry["used"] <= self.ttl and total <= self.max_bytes):
+                continue
+            del self.entries[path]
+            total -= entry["size"]
+            self.removed += 1
+            asyncio.get_running_loop().run_in_executor(None, shutil.rmtree, path, True)
+    
+    def stats(self) -> dict:
+        return {
+            "directories": len(self.entries),
+            "bytes": sum(entry["size"] for entry in self.entries.values()),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "removed": self.removed,
+        }
+
+
+class Metrics:
+    """Counters and latency histograms in the Prometheus text format. Updated
+    from the event loop, rendered from the metrics HTTP thread."""
+    
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["counts"][index] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+    
+    @staticmethod
+    def format_labels(labels) -> str:
+        if not labels:
+            return ''
+        return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+    
+    def render(self, gauges: dict, totals: dict) -> str:
+        """`gauges` and `totals` (counters kept elsewhere) are read at scrape time"""
+        lines = []
+        for name, value in gauges.items():
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        for name, value in totals.items():
+            lines += [f"# TYPE {name} counter", f"{name} {value}"]
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, dict(value, counts=list(value["counts"])))
+                                for key, value in self.histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{self.format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in zip(self.buckets, histogram["counts"]):
+                lines.append(f"{name}_bucket{self.format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{self.format_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+            lines.append(f"{name}_sum{self.format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{self.format_labels(labels)} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+class Trace:
+    """Phase timings of one request: every span feeds the
+    executor_phase_seconds histogram and, with TRACE_FILE set, the request is
+    written there as one JSON line with its spans"""
+    
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = uuid.uuid4().hex
+        self.started = time.monotonic()
+        self.wall_started = time.time()
+        self.spans = []
+    
+    def add(self, phase: str, start: float, end: float, **attributes):
+        _metrics.observe("executor_phase_seconds", end - start, phase=phase)
+        if TRACE_FILE:
+            self.spans.append({
+                "name": phase,
+                "start": round(start - self.started, 6),
+                "duration": round(end - start, 6),
+                **attributes,
+            })
+    
+    @contextlib.contextmanager
+    def span(self, phase: str, **attributes):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(phase, start, time.monotonic(), **attributes)
+    
+    def add_phases(self, phases: dict, **attributes):
+        """Spans measured by a worker (monotonic clock times are system-wide)"""
+        for phase, (start, end) in phases.items():
+            self.add(phase, start, end, **attributes)
+    
+    def finish(self, status: str):
+        duration = time.monotonic() - self.started
+        _metrics.observe("executor_request_seconds", duration, tool=self.name)
+        if not TRACE_FILE:
+            return
+        record = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "timestamp": self.wall_started,
+            "duration": round(duration, 6),
+            "status": status,
+            "attributes": self.attributes,
+            "spans": self.spans,
+        }
+        try:
+            with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            logger.warning(f"Cannot write trace: {e}")
+
+
+@contextlib.asynccontextmanager
+async def traced(name: str, **attributes):
+    """Count and time a tool call: requests, errors and timeouts by tool"""
+    trace = Trace(name, **attributes)
+    _metrics.inc("executor_requests_total", tool=name)
+    status = "ok"
+    try:
+        yield trace
+    except subprocess.TimeoutExpired:
+        status = "timeout"
+        _metrics.inc("executor_timeouts_total", tool=name)
+        raise
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    except Exception as e:
+        status = "error"
+        _metrics.inc("executor_errors_total", tool=name, type=type(e).__name__)
+        raise
     finally:
-        os.unlink(temp_file)
+        trace.finish(status)
+
+
+def record_result(result: dict, tool: str, trace: Trace, **attributes):
+    """Metrics and spans carried by an execution result"""
+    trace.add_phases(result.pop("phases", {}), **attributes)
+    usage = result.get("usage") or {}
+    if usage.get("limit_hit"):
+        _metrics.inc("executor_limit_hits_total", tool=tool, limit=usage["limit_hit"])
+
+
+def render_metrics() -> str:
+    """Metrics with the state of the queue, sessions and caches at scrape time"""
+    environments = _environments.stats()
+    gauges = {
+        "executor_in_flight": _queue.running,
+        "executor_queue_depth": len(_queue.waiters),
+        "executor_sessions_open": len(_sessions.sessions),
+        "executor_environment_cache_entries": environments["environments"],
+        "executor_environment_cache_bytes": environments["bytes"],
+        "executor_result_cache_entries": len(_results.memory),
+        "executor_run_output_bytes": sum(entry["size"] for entry in _run_outputs.entries.values()),
+    }
+    totals = {
+        "executor_queue_rejected_total": _queue.rejected,
+        "executor_result_cache_hits_total": _results.hits,
+        "executor_result_cache_misses_total": _results.misses,
+        "executor_environment_cache_hits_total": environments["hits"],
+        "executor_environment_cache_evictions_total": environments["evicted"],
+        "executor_run_outputs_removed_total": _run_outputs.removed,
+    }
+    return _metrics.render(gauges, totals)
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Serve /metrics from a daemon thread"""
+    if not port:
+        return None
+    httpd = http.server.ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=httpd.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"Metrics on :{port}/metrics")
+    return httpd
+
+
+def cell_source(cell: dict) -> str:
+    source = cell.get("source", "")
+    return ''.join(source) if isinstance(source, list) else source
+
+
+def cell_hash_chain(cells: list) -> list:
+    """Hash of every code cell over its source and the hash of the cell before,
+    so a cell's hash matches only if it and everything above it are unchanged"""
+    hashes = []
+    previous = ''
+    for cell in cells:
+        previous = hashlib.sha256(f"{previous}\0{cell_source(cell)}".encode('utf-8')).hexdigest()
+        hashes.append(previous)
+    return hashes
+
+
+def cell_outputs(result: dict) -> list:
+    """nbformat v4 outputs of one cell run"""
+    outputs = []
+    for name in ("stdout", "stderr"):
+        if result.get(name):
+            outputs.append({"output_type": "stream", "name": name, "text": result[name]})
+    if result.get("returncode"):
+        last_line = (result.get("stderr") or '').rstrip().rsplit('\n', 1)[-1]
+        ename, _, evalue = last_line.partition(': ')
+        outputs.append({
+            "output_type": "error",
+            "ename": ename or "Error",
+            "evalue": evalue,
+            "traceback": (result.get("stderr") or '').splitlines(),
+        })
+    return outputs
+
+
+def load_notebook(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_notebook(path: str, notebook: dict):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.ipynb.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(notebook, f, indent=2)
+    os.replace(temp_path, path)
+
+
+_metrics = Metrics()
+_pool = None
+_pool_lock = threading.Lock()
+_queue = ExecutionQueue()
+_sessions = SessionManager()
+_environments = EnvironmentCache()
+_results = ResultCache()
+_run_outputs = RunOutputs()
+# Notebook path -> {"lock", "session_id", "executed": hashes of the cells the
+# kernel ran, in order, "count": execution counter}
+_notebooks = {}
+
+
+def get_pool():
+    """Shared worker pool, or None when disabled or fork is unavailable"""
+    global _pool
+    if WORKER_POOL_SIZE <= 0 or not hasattr(os, 'fork'):
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool()
+        return _pool
+
+
+def sandbox_environ() -> dict:
+    """Environment of a fresh interpreter: sandbox.py is importable from this directory"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    path = os.environ.get('PYTHONPATH')
+    return {**os.environ, 'PYTHONPATH': f"{directory}{os.pathsep}{path}" if path else directory}
+
+
+def parse_response(data: bytes) -> dict:
+    """Numbers a fresh interpreter reports before it exits. The pipe is in the
+    same process as the user's code, so anything else (or invalid JSON) is
+    ignored rather than trusted."""
+    try:
+        response = json.loads(data) if data else {}
+    except ValueError:
+        return {}
+    if not isinstance(response, dict):
+        return {}
+    return {key: value for key, value in response.items()
+            if key in ("started", "user_time", "system_time", "peak_rss")
+            and isinstance(value, (int, float)) and not isinstance(value, bool)}
+
+
+async def run_subprocess(envelope: dict, timeout: float, on_output=None) -> dict:
+    """Run the envelope's code in a fresh interpreter. The envelope goes over
+    stdin and the response comes back on a pipe, so nothing is written to disk;
+    the child is killed on timeout or cancellation."""
+    buffers = {"stdout": OutputBuffer(), "stderr": OutputBuffer()}
+    limits = envelope.get('limits') or {}
+    cgroup = create_cgroup(limits)
+    if cgroup is not None:
+        envelope = {**envelope, "limits": {**limits, "cgroup_path": cgroup}}
+    response_r, response_w = os.pipe()
+    started = time.monotonic()
+    
+    async def pump(reader, name):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            data = await reader.read(OUTPUT_CHUNK)
+            if not data:
+                break
+            buffers[name].write(data)
+            if on_output is not None:
+                text = decoder.decode(data)
+                if text:
+                    await on_output(name, text)
+    
+    try:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, '-c', 'import sandbox; sandbox.main()', str(response_w),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                pass_fds=(response_w,),
+                env=sandbox_environ()
+            )
+        finally:
+            os.close(response_w)
+        launched = time.monotonic()
+        
+        async def send_envelope():
+            process.stdin.write(json.dumps(envelope).encode('utf-8'))
+            try:
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # The child exited before reading it; its output says why
+                pass
+            process.stdin.close()
+        
+        gathered = asyncio.gather(send_envelope(), pump(process.stdout, "stdout"), pump(process.stderr, "stderr"),
+                                  process.wait())
+        try:
+            await asyncio.wait_for(gathered, timeout)
+            timed_out = False
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            timed_out = True
+        except BaseException:
+            process.kill()
+            await process.wait()
+            if gathered.done() and not gathered.cancelled():
+                gathered.exception()
+            raise
+        
+        # The response is a few bytes written just before exit; a child that
+        # was killed or crashed leaves it empty
+        response = {}
+        if not timed_out:
+            response = parse_response(os.read(response_r, OUTPUT_CHUNK))
+        
+        exited = time.monotonic()
+        wall_time = exited - started
+        cgroup_usage = {}
+        if cgroup is not None:
+            cgroup_usage = read_cgroup(cgroup)
+        
+        result = {
+            "stdout": buffers["stdout"].getvalue(),
+            "stderr": buffers["stderr"].getvalue(),
+            "returncode": process.returncode,
+            "timed_out": timed_out,
+        }
+        # A killed child sends no response, so its CPU times are unknown
+        result["usage"] = execution_usage(
+            result, wall_time, response.get("user_time"), response.get("system_time"),
+            response.get("peak_rss"), cgroup_usage, limits
+        )
+        # Spawn includes interpreter start-up, up to the bootstrap's first line
+        running = response.get("started", launched)
+        result["phases"] = {"spawn": (started, running), "execution": (running, exited),
+                            "encoding": (exited, time.monotonic())}
+        return result
+    finally:
+        os.close(response_r)
+        if cgroup is not None:
+            await asyncio.get_running_loop().run_in_executor(None, remove_cgroup, cgroup)
+
+
+async def run_envelope(envelope: dict, timeout: float, on_output=None, trace: Trace = None, **attributes) -> dict:
+    """Run one execution on the warm pool, or in a fresh interpreter without one"""
+    envelope = {**envelope, "limits": get_limits()}
+    pool = get_pool()
+    if pool is not None:
+        result = await pool.execute(envelope, timeout, on_output)
+    else:
+        result = await run_subprocess(envelope, timeout, on_output)
+    if trace is not None:
+        record_result(result, trace.name, trace, **attributes)
+    return result
+
+
+async def acquire_environment(pip_install: list):
+    """Cached environment for the allow-listed part of `pip_install` (or None);
+    raises PackageInstallError when it cannot be installed"""
+    if not pip_install:
+        return None
+    allowed = {normalize_package(name) for name in allowed_modules()}
+    return await _environments.acquire(
+        [package for package in pip_install if normalize_package(package) in allowed]
+    )
+
+
+def stage_data_inputs(data_inputs: dict) -> tuple:
+    """Files the sandbox maps for data_inputs: base64 payloads are decoded once
+    into shared memory segments, paths must be files under OUTPUT_DIR (e.g.
+    data outputs of an earlier run). Returns ({name: path}, segments to unlink)."""
+    root = os.path.realpath(OUTPUT_DIR)
+    paths = {}
+    segments = []
+    try:
+        for name, spec in data_inputs.items():
+            if 'path' in spec:
+                path = os.path.realpath(spec['path'])
+                if os.path.commonpath([path, root]) != root or not os.path.isfile(path):
+                    raise ValueError(f"Data input {name} must be a file under {OUTPUT_DIR}")
+                paths[name] = path
+                continue
+            payload = base64.b64decode(spec['base64'])
+            if not payload:
+                paths[name] = os.devnull
+                continue
+            segment = shared_memory.SharedMemory(create=True, size=len(payload))
+            segments.append(segment)
+            segment.buf[:len(payload)] = payload
+            paths[name] = f"/dev/shm/{segment.name.lstrip('/')}"
+    except BaseException:
+        release_segments(segments)
+        raise
+    return paths, segments
+
+
+def release_segments(segments: list):
+    for segment in segments:
+        segment.close()
+        segment.unlink()
+
+
+def collect_data_outputs(directory: str) -> dict:
+    """name -> {"path", "size"} of the buffers a run allocated with data_output()"""
+    if not os.path.isdir(directory):
+        return {}
+    return {
+        entry.name: {"path": entry.path, "size": entry.stat().st_size}
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name)
+    }
+
+
+async def notify_progress(progress_token, sequence: int, stream: str, data: str):
+    """Send one output chunk to the client as an MCP progress notification"""
+    await server.send_notification("notifications/progress", {
+        "progressToken": progress_token,
+        "progress": sequence,
+        "message": data,
+        "stream": stream,
+    })
+
+
+@server.tool("execute_python")
+async def execute_python(code: str, pip_install: list = None, progress_token: str = None,
+                         cache: bool = False, inputs: list = None, args: list = None, env: dict = None,
+                         data_inputs: dict = None):
+    """Execute Python code safely in a sandboxed environment.
+    `args` become sys.argv[1:] and `env` is added to os.environ of the run.
+    With a progress_token, stdout/stderr chunks are streamed as progress notifications.
+    With cache=True, a successful result is memoized for identical code, packages
+    and contents of the `inputs` files, and returned without running anything
+    (not combined with data_inputs). A cached run gets its own directory under
+    /outputs/runs as working directory and $OUTPUT_DIR, returned as output_dir;
+    the files it writes there are restored on later hits.
+    Binary data: data_inputs maps names to {"base64": ...} or {"path": file under
+    /outputs}; the code sees them as read-only buffers in DATA[name] (e.g.
+    numpy.frombuffer(DATA['x'], 'f8'), no copy). data_output(name, size) returns
+    a writable buffer that is handed back as a file in result["data_outputs"].
+    A pip_install package that cannot be installed fails the call with pip's error.
+    Data outputs and output_dir are kept for RUN_OUTPUT_TTL seconds after their
+    last use (as a data input or cache hit); beyond RUN_OUTPUT_SIZE in total the
+    least recently used go first."""
+    
+    async with traced("execute_python") as trace:
+        cache_key = None
+        if cache and not data_inputs:
+            if inputs and _results.stale_inputs(inputs):
+                # Hashing new or changed input files is disk I/O; keep it off the event loop
+                cache_key = await asyncio.get_running_loop().run_in_executor(
+                    None, _results.key, code, pip_install or [], inputs, args, env
+                )
+            else:
+                cache_key = _results.key(code, pip_install or [], inputs or [], args, env)
+            with trace.span("cache_lookup"):
+                cached = await _results.get(cache_key)
+            if cached is not None:
+                trace.attributes["cached"] = True
+                return cached
+        
+        on_output = None
+        if progress_token is not None:
+            sequence = 0
+            
+            async def on_output(stream, data):
+                nonlocal sequence
+                sequence += 1
+                await notify_progress(progress_token, sequence, stream, data)
+        
+        # Packages come from a cached environment, built before taking an
+        # execution slot the first time a package set is requested
+        with trace.span("pip_install"):
+            environment = await acquire_environment(pip_install)
+        envelope = {
+            "code": code,
+            "args": args or [],
+            "env": env or {},
+            "path": [environment["path"]] if environment is not None else [],
+            "data": {},
+            "data_dir": os.path.join(OUTPUT_DIR, 'data', uuid.uuid4().hex),
+        }
+        if cache_key is not None:
+            # Only what the run writes to its own directory is cached, never
+            # files of other runs writing to OUTPUT_DIR at the same time
+            envelope["output_dir"] = os.path.join(OUTPUT_DIR, 'runs', uuid.uuid4().hex)
+            envelope["data_dir"] = os.path.join(envelope["output_dir"], 'data')
+            os.makedirs(envelope["output_dir"])
+        segments = []
+        in_use = await _run_outputs.acquire(
+            [envelope["data_dir"], envelope.get("output_dir")]
+            + [spec["path"] for spec in (data_inputs or {}).values() if "path" in spec]
+        )
+        
+        try:
+            if data_inputs:
+                with trace.span("staging"):
+                    envelope["data"], segments = await asyncio.get_running_loop().run_in_executor(
+                        None, stage_data_inputs, data_inputs
+                    )
+            with trace.span("queue_wait"):
+                await _queue.acquire()
+            try:
+                timeout = int(os.environ.get('EXECUTION_TIMEOUT', 30))
+                result = await run_envelope(envelope, timeout, on_output, trace)
+                data_outputs = collect_data_outputs(envelope["data_dir"])
+                if data_outputs:
+                    result["data_outputs"] = data_outputs
+            finally:
+                _queue.release()
+        finally:
+            release_segments(segments)
+            _environments.release(environment)
+            _run_outputs.release(in_use)
+        
+        if result.pop("timed_out"):
+            raise subprocess.TimeoutExpired('execute_python', timeout, result["stdout"], result["stderr"])
+        if cache_key is not None:
+            result["output_dir"] = envelope["output_dir"]
+            if result["returncode"] == 0:
+                artifacts = await asyncio.get_running_loop().run_in_executor(
+                    None, collect_artifacts, envelope["output_dir"]
+                )
+                await _results.put(cache_key, result, artifacts)
+        return result
+
+@server.tool("execute_batch")
+async def execute_batch(items: list, pip_install: list = None, shared_input=None,
+                        timeout: float = None, progress_token: str = None):
+    """Execute independent snippets in parallel on the worker pool.
+    Each item is a code string or {"code", "args", "env"}; all share the
+    pip_install packages and `shared_input` (bound as INPUT in every item).
+    `timeout` applies per item (at most EXECUTION_TIMEOUT). Results come back
+    in item order, shaped like execute_python results; an item that timed out
+    has usage.limit_hit "timeout" and one that could not run has returncode 1
+    and the error in stderr. With a progress_token each one is also sent as a
+    progress notification as soon as it finishes."""
+    
+    max_timeout = int(os.environ.get('EXECUTION_TIMEOUT', 30))
+    timeout = min(timeout or max_timeout, max_timeout)
+    items = [{"code": item} if isinstance(item, str) else item for item in items]
+    results = [None] * len(items)
+    if not items:
+        return {"results": results}
+    
+    async with traced("execute_batch", items=len(items)) as trace:
+        with trace.span("pip_install"):
+            environment = await acquire_environment(pip_install)
+        path = [environment["path"]] if environment is not None else []
+        pending = iter(range(len(items)))
+        finished = 0
+        
+        async def run_item(index: int) -> dict:
+            envelope = {
+                "code": items[index]["code"],
+                "args": items[index].get("args") or [],
+                "env": items[index].get("env") or {},
+                "path": path,
+            }
+            if shared_input is not None:
+                envelope["input"] = shared_input
+            with trace.span("queue_wait", item=index):
+                await _queue.acquire()
+            try:
+                result = await run_envelope(envelope, timeout, trace=trace, item=index)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # One broken item does not fail the batch
+                _metrics.inc("executor_errors_total", tool="execute_batch", type=type(e).__name__)
+                result = {"stdout": "", "stderr": f"{type(e).__name__}: {e}\n", "returncode": 1}
+                result["usage"] = execution_usage(result, 0, None, None, None, {}, {})
+                return result
+            finally:
+                _queue.release()
+            # Reported as usage.limit_hit, as in execute_in_session results
+            if result.pop("timed_out"):
+                _metrics.inc("executor_timeouts_total", tool="execute_batch")
+            return result
+        
+        async def runner():
+            # Each runner holds at most one queue slot, so a batch cannot
+            # flood the queue or starve other requests
+            nonlocal finished
+            for index in pending:
+                results[index] = await run_item(index)
+                finished += 1
+                if progress_token is not None:
+                    await server.send_notification("notifications/progress", {
+                        "progressToken": progress_token,
+                        "progress": finished,
+                        "total": len(items),
+                        "index": index,
+                        "result": results[index],
+                    })
+        
+        try:
+            await asyncio.gather(*[runner() for _ in range(min(len(items), _queue.max_concurrency))])
+        finally:
+            _environments.release(environment)
+        return {"results": results}
+
+@server.tool("executor_status")
+async def executor_status():
+    """Report running and queued executions and open sessions"""
+    
+    limits = {name: value for name, value in get_limits().items() if name != "cgroup"}
+    limits["cgroup"] = get_limits()["cgroup"] is not None
+    return {**_queue.stats(), "limits": limits, "sessions": _sessions.stats(),
+            "environments": _environments.stats(), "results": _results.stats(),
+            "run_outputs": _run_outputs.stats()}
+
+@server.tool("open_session")
+async def open_session():
+    """Start a persistent Python session whose globals survive between calls"""
+    
+    session = await _sessions.open()
+    return {"session_id": session["id"]}
+
+@server.tool("execute_in_session")
+async def execute_in_session(session_id: str, code: str):
+    """Execute Python code in an open session. The limits of execute_python
+    apply, with one memory budget for the session's state; the result has the
+    same usage block."""
+    
+    timeout = int(os.environ.get('EXECUTION_TIMEOUT', 30))
+    async with traced("execute_in_session") as trace:
+        with trace.span("queue_wait"):
+            await _queue.acquire()
+        try:
+            with trace.span("execution"):
+                return await _sessions.execute(session_id, code, timeout)
+        finally:
+            _queue.release()
+
+@server.tool("close_session")
+async def close_session(session_id: str):
+    """Close a session and free its memory"""
+    
+    _sessions.close(session_id)
+    return {"success": True}
 
 @server.tool("create_notebook")
 async def create_notebook(name: str, cells: list):
@@ -68,11 +2258,105 @@ async def create_notebook(name: str, cells: list):
         "nbformat_minor": 4
     }
     
-    path = f"/notebooks/{name}.ipynb"
+    path = os.path.join(NOTEBOOK_DIR, f"{name}.ipynb")
     with open(path, 'w') as f:
         json.dump(notebook, f, indent=2)
     
     return {"path": path, "success": True}
 
+@server.tool("execute_notebook")
+async def execute_notebook(name: str, force: bool = False):
+    """Run a notebook's code cells in one persistent interpreter and store the
+    outputs in the notebook. Cells keep a hash chained over their sources; a
+    rerun keeps the outputs of the unchanged prefix and executes from the first
+    changed cell on, resuming the kernel from its nearest checkpoint before
+    that cell (see NOTEBOOK_CHECKPOINTS). Cells run with the limits of
+    execute_in_session. force=True runs every cell."""
+    
+    path = os.path.join(NOTEBOOK_DIR, f"{name}.ipynb")
+    timeout = int(os.environ.get('EXECUTION_TIMEOUT', 30))
+    loop = asyncio.get_running_loop()
+    kernel = _notebooks.setdefault(path, {"lock": asyncio.Lock(), "session_id": None, "executed": [], "count": 0})
+    
+    async with traced("execute_notebook") as trace, kernel["lock"]:
+        notebook = await loop.run_in_executor(None, load_notebook, path)
+        cells = [cell for cell in notebook.get("cells", []) if cell.get("cell_type") == "code"]
+        hashes = cell_hash_chain(cells)
+        stored = [cell.get("metadata", {}).get("python_executor", {}).get("hash") for cell in cells]
+        first = 0 if force else next((index for index, cell_hash in enumerate(hashes) if stored[index] != cell_hash),
+                                     len(cells))
+        response = {"path": path, "cells": len(cells), "executed": 0, "reused": first,
+                    "failed_cell": None, "success": True}
+        if first == len(cells):
+            return response
+        
+        # Resume from the kernel's nearest checkpoint before the first changed
+        # cell if it ran exactly the unchanged prefix, else rebuild state from
+        # the top; unchanged cells after that checkpoint run again
+        start = None
+        if kernel["session_id"] in _sessions.sessions and kernel["executed"][:first] == hashes[:first]:
+            start = first
+            if len(kernel["executed"]) > first:
+                with trace.span("restore"):
+                    reply = await _sessions.request(kernel["session_id"], {"restore": first}, timeout,
+                                                    'execute_notebook')
+                # None when the kernel died instead
+                start = reply.get("restored")
+                del kernel["executed"][start or 0:]
+        if start is None:
+            if kernel["session_id"] in _sessions.sessions:
+                _sessions.discard(kernel["session_id"])
+            with trace.span("spawn"):
+                kernel["session_id"] = (await _sessions.open(_notebook_main, NOTEBOOK_CHECKPOINTS + 1))["id"]
+            kernel["executed"] = []
+            start = 0
+        response["reused"] = start
+        
+        for index in range(start, len(cells)):
+            cell = cells[index]
+            if kernel["session_id"] is None:
+                # Evicted after the previous cell, its state is gone
+                result = {"stdout": "", "stderr": "SessionEvicted: the kernel exceeded SESSION_MEMORY_LIMIT\n",
+                          "returncode": 1}
+            else:
+                with trace.span("queue_wait", cell=index):
+                    await _queue.acquire()
+                try:
+                    with trace.span("execution", cell=index):
+                        result = await _sessions.execute(kernel["session_id"], cell_source(cell), timeout,
+                                                         'execute_notebook')
+                except subprocess.TimeoutExpired:
+                    result = {"stdout": "", "stderr": f"TimeoutExpired: cell exceeded {timeout} seconds\n",
+                              "returncode": 1}
+                finally:
+                    _queue.release()
+            
+            if kernel["session_id"] in _sessions.sessions:
+                kernel["executed"].append(hashes[index])
+            else:
+                # Timed out, killed at a limit or evicted: gone with its checkpoints
+                kernel.update(session_id=None, executed=[])
+            kernel["count"] += 1
+            cell["execution_count"] = kernel["count"]
+            cell["outputs"] = cell_outputs(result)
+            metadata = cell.setdefault("metadata", {})
+            response["executed"] += 1
+            if result["returncode"]:
+                # Not marked as run: the next call starts again at this cell
+                metadata.pop("python_executor", None)
+                response.update(failed_cell=index, success=False)
+                for later in cells[index + 1:]:
+                    later.get("metadata", {}).pop("python_executor", None)
+                break
+            metadata["python_executor"] = {"hash": hashes[index]}
+        
+        await loop.run_in_executor(None, save_notebook, path, notebook)
+        return response
+
 if __name__ == "__main__":
-    server.start()
\ No newline at end of file
+    # Move into the cgroup layout, then start the zygote and warm workers
+    # before accepting requests
+    get_limits()
+    get_pool()
+    start_metrics_server()
+    server.start()